@@ -1,41 +1,73 @@
-
 import json
 import os
 from typing import Any, Text, Dict, List
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
 import re
 import random
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics, small_talk
+from .cache import LRUCache, normalize_message
+from .knowledge_base import KnowledgeBase
+
+# Best knowledge-base match for one message; answer is None below the threshold.
+SimilarResponse = namedtuple("SimilarResponse", ["answer", "score", "index"])
+
+# --- Fallback search pool ---
+# The similarity search runs on a small thread pool so it never blocks the
+# action server's event loop. A search that misses the deadline is answered
+# with a canned response; when every slot is busy new searches are not
+# queued at all.
+FALLBACK_WORKERS = int(os.environ.get("FALLBACK_WORKERS", "4"))
+FALLBACK_MAX_PENDING = int(os.environ.get("FALLBACK_MAX_PENDING", str(FALLBACK_WORKERS * 2)))
+FALLBACK_DEADLINE_SECONDS = float(os.environ.get("FALLBACK_DEADLINE_SECONDS", "2.0"))
+
+fallback_executor = ThreadPoolExecutor(max_workers=FALLBACK_WORKERS, thread_name_prefix="fallback-search")
+_fallback_slots = threading.BoundedSemaphore(FALLBACK_MAX_PENDING)
 
 class ActionDefaultFallback(Action):
     def name(self) -> Text:
         return "action_default_fallback"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
+        with metrics.span("turn"):
+            return await self._respond(dispatcher, tracker)
+
+    async def _respond(self, dispatcher: CollectingDispatcher, tracker: Tracker) -> List[Dict[Text, Any]]:
         user_message = tracker.latest_message.get('text', '').lower().strip()
         
+        with metrics.span("small_talk"):
+            greeting = self.is_greeting(user_message)
+            goodbye = not greeting and self.is_goodbye(user_message)
+
         # Check if it's a greeting that might have been missed
-        if self.is_greeting(user_message):
+        if greeting:
+            metrics.TURNS.inc(outcome="greeting")
             dispatcher.utter_message(text="Hello! How can I help you today?")
             return []
         
         # Check if it's a goodbye
-        if self.is_goodbye(user_message):
+        if goodbye:
+            metrics.TURNS.inc(outcome="goodbye")
             dispatcher.utter_message(text="Goodbye! Have a great day!")
             return []
         
         # Try to find similar questions in the dataset
-        similar_response = self.find_similar_response(user_message)
+        with metrics.span("search"):
+            similar_response = await self.find_similar_response_async(user_message)
         
         if similar_response:
+            metrics.TURNS.inc(outcome="knowledge_base")
             dispatcher.utter_message(text=similar_response)
         else:
+            metrics.TURNS.inc(outcome="canned")
             # Enhanced fallback responses
             fallback_responses = [
                 "I'm not sure I understand that completely. Could you rephrase your question?",
@@ -47,57 +79,103 @@ class ActionDefaultFallback(Action):
         
         return []
 
-    def is_greeting(self, text):
-        greeting_patterns = [
-            'hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening',
-            'what\'s up', 'how are you', 'howdy', 'greetings', 'sup', 'yo'
-        ]
-        return any(pattern in text for pattern in greeting_patterns)
+    @staticmethod
+    def is_greeting(text):
+        return small_talk.is_greeting(text)
 
-    def is_goodbye(self, text):
-        goodbye_patterns = [
-            'bye', 'goodbye', 'see you', 'take care', 'farewell', 'later',
-            'catch you later', 'have a good day', 'good night'
-        ]
-        return any(pattern in text for pattern in goodbye_patterns)
+    @staticmethod
+    def is_goodbye(text):
+        return small_talk.is_goodbye(text)
 
     def find_similar_response(self, user_message: str, threshold: float = 0.3) -> str:
         try:
-            csv_file = "Conversation.csv"
-            if os.path.exists(csv_file):
-                df = pd.read_csv(csv_file)
-                questions = df['question'].dropna().tolist()
-                answers = df['answer'].dropna().tolist()
-                
-                if not questions:
-                    return None
-                
-                # Filter out greetings and goodbyes
-                filtered_questions = []
-                filtered_answers = []
-                for q, a in zip(questions, answers):
-                    if not (self.is_greeting(q.lower()) or self.is_goodbye(q.lower())):
-                        filtered_questions.append(q)
-                        filtered_answers.append(a)
-                
-                if not filtered_questions:
-                    return None
-                
-                vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2))
-                all_text = [user_message] + filtered_questions
-                tfidf_matrix = vectorizer.fit_transform(all_text)
-                
-                similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
-                
-                best_match_idx = similarities.argmax()
-                if similarities[best_match_idx] > threshold:
-                    return filtered_answers[best_match_idx]
-            
+            # Keyed on the KB version too, so a reloaded KB never serves stale answers.
+            index = knowledge_base.get()
+            key = (index.version if index is not None else None, normalize_message(user_message), threshold)
+            found, answer = answer_cache.get(key)
+            if found:
+                return answer
+
+            answer = self.find_similar_responses([user_message], threshold)[0].answer
+            answer_cache.put(key, answer)
+            return answer
         except Exception as e:
+            metrics.SEARCH_FAILURES.inc(reason="error")
             print(f"Error in similarity matching: {e}")
         
         return None
 
+    async def find_similar_response_async(self, user_message: str, threshold: float = 0.3,
+                                          deadline: float = FALLBACK_DEADLINE_SECONDS) -> str:
+        """Runs find_similar_response on the fallback pool, giving up after deadline seconds."""
+        if not _fallback_slots.acquire(blocking=False):
+            metrics.SEARCH_FAILURES.inc(reason="saturated")
+            print("Fallback search pool is saturated, using a canned response")
+            return None
+
+        def search():
+            # Free the slot only when the search really finishes, even after a timeout.
+            try:
+                return self.find_similar_response(user_message, threshold)
+            finally:
+                _fallback_slots.release()
+
+        future = asyncio.get_running_loop().run_in_executor(fallback_executor, search)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline)
+        except asyncio.TimeoutError:
+            metrics.SEARCH_FAILURES.inc(reason="timeout")
+            print(f"Similarity search exceeded {deadline}s, using a canned response")
+            return None
+
+    def find_similar_responses(self, user_messages: List[str], threshold: float = 0.3) -> List[SimilarResponse]:
+        """Matches many messages at once, e.g. when replaying logs offline.
+
+        All messages are vectorized into one sparse matrix and scored
+        together. Returns one SimilarResponse per message, in order.
+        """
+        index = knowledge_base.get()
+        if index is None:
+            metrics.MATCHES.inc(len(user_messages), result="no_match")
+            return [SimilarResponse(None, 0.0, None) for _ in user_messages]
+
+        results = []
+        for matches in index.search_batch(user_messages, k=1):
+            if not matches:
+                metrics.MATCHES.inc(result="no_match")
+                results.append(SimilarResponse(None, 0.0, None))
+                continue
+            best = matches[0]
+            above = best.score > threshold
+            metrics.MATCHES.inc(result="above_threshold" if above else "below_threshold")
+            results.append(SimilarResponse(best.answer if above else None, best.score, best.index))
+        return results
+
+
+# Built once when the action server imports this module; reloaded when the CSV changes.
+knowledge_base = KnowledgeBase(exclude=small_talk.is_small_talk, filter_signature=small_talk.signature(),
+                               deduplicate=True)
+knowledge_base.get()
+
+# Matcher results for recently seen fallback messages.
+answer_cache = LRUCache()
+
+# Values kept by the knowledge base and the cache, read when /metrics is scraped.
+metrics.CallbackMetric(
+    "fallback_answer_cache_requests_total", "Answer cache lookups by result.", "counter",
+    lambda: [({"result": "hit"}, answer_cache.hits), ({"result": "miss"}, answer_cache.misses)],
+)
+metrics.CallbackMetric(
+    "fallback_answer_cache_entries", "Entries currently in the answer cache.", "gauge",
+    lambda: [({}, len(answer_cache))],
+)
+metrics.CallbackMetric(
+    "knowledge_base_questions", "Questions in the loaded knowledge base.", "gauge",
+    lambda: [({}, len(knowledge_base.index) if knowledge_base.index is not None else 0)],
+)
+# Only where METRICS_PORT is set, i.e. in the action server (see README)
+metrics.start_server()
+
 class ActionProvideHelp(Action):
     def name(self) -> Text:
         return "action_provide_help"
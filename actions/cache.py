@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Text, Tuple
+
+# --- Configuration ---
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "4096"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "600"))
+
+
+def normalize_message(text: Text) -> Text:
+    """Lowercases, strips and collapses whitespace, so trivial variants share a cache entry."""
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and entry age.
+
+    The least recently used entry is evicted once max_size is reached, and
+    entries older than ttl seconds are treated as missing. Hit, miss,
+    eviction and expiry counts are kept for monitoring.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (found, value); value is None when not found."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[Text, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,379 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Text, Tuple
+
+import numpy as np
+
+# --- Configuration ---
+# Questions whose estimated Jaccard similarity (over character shingles of
+# the normalized text) reaches this are treated as near-duplicates.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("CORPUS_NEAR_DUPLICATE_THRESHOLD", "0.85"))
+
+# MinHash/LSH settings. BANDS * ROWS_PER_BAND hash functions per question;
+# two questions become candidates when any band matches exactly.
+SHINGLE_SIZE = 4
+MINHASH_BANDS = 16
+MINHASH_ROWS_PER_BAND = 4
+MINHASH_SEED = 1
+# Rows remembered per LSH bucket. Very common shingle patterns would
+# otherwise make every new row compare against thousands of candidates.
+MAX_BUCKET_SIZE = 64
+# Rows shingled, hashed and merged into the band tables together
+DEDUP_BLOCK_SIZE = 1024
+_MERSENNE_PRIME = (1 << 31) - 1
+# Candidate pairs compared at once (bounds the temporary signature copies)
+_PAIRS_PER_STEP = 65536
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_question(text: Text) -> Text:
+    """Lowercases, drops apostrophes, and turns other punctuation and whitespace runs into single spaces."""
+    text = _APOSTROPHES.sub("", str(text).lower())
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def read_pairs(csv_file: Text) -> List[Tuple[Text, Text]]:
+    """(question, answer) rows of a knowledge-base CSV, skipping empty ones."""
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        pairs = []
+        for row in csv.DictReader(f):
+            question = (row.get("question") or "").strip()
+            answer = (row.get("answer") or "").strip()
+            if question and answer:
+                pairs.append((question, answer))
+        return pairs
+
+
+class MinHasher:
+    """MinHash signatures over character shingles, with universal hashing mod a Mersenne prime."""
+
+    def __init__(self, num_perm: int = MINHASH_BANDS * MINHASH_ROWS_PER_BAND,
+                 shingle_size: int = SHINGLE_SIZE, seed: int = MINHASH_SEED):
+        rng = np.random.RandomState(seed)
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.int64)
+
+    def shingles(self, normalized: Text) -> List[int]:
+        n = self.shingle_size
+        return [zlib.crc32(g.encode("utf-8"))
+                for g in {normalized[i:i + n] for i in range(max(1, len(normalized) - n + 1))}]
+
+    def signatures(self, texts: List[Text]) -> np.ndarray:
+        """One signature row per normalized text, hashing all their shingles in one pass."""
+        hashes = []
+        starts = []
+        for text in texts:
+            starts.append(len(hashes))
+            hashes.extend(self.shingles(text))
+        if not texts:
+            return np.zeros((0, len(self._a)), dtype=np.uint32)
+        values = (self._a * (np.asarray(hashes, dtype=np.int64) % _MERSENNE_PRIME) + self._b) % _MERSENNE_PRIME
+        return np.minimum.reduceat(values, starts, axis=1).T.astype(np.uint32)
+
+    def signature(self, normalized: Text) -> np.ndarray:
+        return self.signatures([normalized])[0]
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """64-bit key of each LSH band of each signature, shape (rows, MINHASH_BANDS)."""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), MINHASH_BANDS, MINHASH_ROWS_PER_BAND)
+    keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for i in range(MINHASH_ROWS_PER_BAND):
+        keys = keys * np.uint64(0x9E3779B97F4A7C15) + bands[:, :, i]
+    return keys
+
+
+def _exact_key(normalized: Text) -> int:
+    return int.from_bytes(hashlib.sha1(normalized.encode("utf-8")).digest()[:8], "little")
+
+
+def _merge_sorted(keys: np.ndarray, values: Optional[np.ndarray], new_keys: np.ndarray,
+                  new_values: Optional[np.ndarray] = None):
+    """Inserts new_keys (and their values) into sorted keys, after any equal existing keys."""
+    order = np.argsort(new_keys, kind="stable")
+    positions = np.searchsorted(keys, new_keys[order], side="right")
+    keys = np.insert(keys, positions, new_keys[order])
+    if values is not None:
+        values = np.insert(values, positions, new_values[order])
+    return keys, values
+
+
+# Counts from one deduplication run.
+CorpusReport = namedtuple("CorpusReport", [
+    "input_rows", "kept_rows", "exact_duplicates", "near_duplicates",
+    "chain_links", "chains", "longest_chain",
+])
+
+
+def format_report(report: CorpusReport) -> Text:
+    removed = report.input_rows - report.kept_rows
+    share = removed / report.input_rows if report.input_rows else 0.0
+    return (f"{report.input_rows} rows -> {report.kept_rows} "
+            f"({removed} removed, {share:.1%}: {report.exact_duplicates} exact and "
+            f"{report.near_duplicates} near-duplicate questions); "
+            f"{report.chain_links} rows continue a conversation chain "
+            f"({report.chains} chains, longest {report.longest_chain} rows)")
+
+
+class ChainStats:
+    """Counts rows whose question repeats the previous row's answer, i.e. chained dialogue."""
+
+    def __init__(self):
+        self.links = 0
+        self.chains = 0
+        self.longest = 0
+        self._length = 1
+        self._previous_answer = None
+
+    def observe(self, question: Text, answer: Text):
+        """Takes one row's normalized question and answer, in CSV order."""
+        if question and question == self._previous_answer:
+            self.links += 1
+            self._length += 1
+        else:
+            self._close()
+        self._previous_answer = answer
+
+    def _close(self):
+        if self._length > 1:
+            self.chains += 1
+            self.longest = max(self.longest, self._length)
+        self._length = 1
+
+    def result(self) -> Tuple[int, int, int]:
+        """(links, chains, longest chain), counting a chain still in progress."""
+        chains, longest = self.chains, self.longest
+        if self._length > 1:
+            chains += 1
+            longest = max(longest, self._length)
+        return self.links, chains, longest
+
+
+class Deduplicator:
+    """Drops rows whose question repeats, exactly or nearly, an earlier kept question.
+
+    Rows are fed in CSV order, in as many batches as convenient; the first
+    occurrence of a question is kept with its answer. Exact duplicates are
+    found by hashing the normalized question, near-duplicates with
+    MinHash/LSH. Chained dialogue rows (a question that repeats the previous
+    row's answer) are counted for the report but kept, since the answer to
+    such a turn is still a useful reply.
+
+    State is compact numpy arrays, about 450 bytes per kept row: a 64-bit
+    hash per question, its signature, and per band a sorted table of band
+    keys and row numbers. Rows are processed in blocks of DEDUP_BLOCK_SIZE,
+    so shingling and MinHash run vectorized.
+    """
+
+    def __init__(self, near_threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.near_threshold = near_threshold
+        self.hasher = MinHasher()
+        self._exact = np.zeros(0, dtype=np.uint64)
+        self._band_keys = [np.zeros(0, dtype=np.uint64) for _ in range(MINHASH_BANDS)]
+        self._band_rows = [np.zeros(0, dtype=np.int32) for _ in range(MINHASH_BANDS)]
+        self._signatures = np.zeros((1024, MINHASH_BANDS * MINHASH_ROWS_PER_BAND), dtype=np.uint32)
+        self._signature_count = 0
+        self.chain_stats = ChainStats()
+        self.input_rows = 0
+        self.kept_rows = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def keep(self, question: Text, answer: Text) -> bool:
+        """Records one row and returns whether it should be kept. Prefer filter() for many rows."""
+        return self.filter([question], [answer])[0]
+
+    def filter(self, questions: Iterable[Text], answers: Iterable[Text]) -> List[bool]:
+        """Records a batch of rows and returns one keep flag per row."""
+        questions = list(questions)
+        answers = list(answers)
+        flags = []
+        for start in range(0, len(questions), DEDUP_BLOCK_SIZE):
+            end = start + DEDUP_BLOCK_SIZE
+            flags.extend(self._filter_block(questions[start:end], answers[start:end]))
+        return flags
+
+    def _filter_block(self, questions: List[Text], answers: List[Text]) -> List[bool]:
+        normalized = [normalize_question(q) for q in questions]
+        for question, answer in zip(normalized, answers):
+            self.chain_stats.observe(question, normalize_question(answer))
+
+        exact = np.fromiter((_exact_key(q) for q in normalized), dtype=np.uint64, count=len(normalized))
+        positions = np.searchsorted(self._exact, exact)
+        seen = positions < len(self._exact)
+        seen[seen] = self._exact[positions[seen]] == exact[seen]
+
+        near = self.near_threshold < 1.0
+        if near:
+            signatures = self.hasher.signatures(normalized)
+            bands = band_keys(signatures)
+            similar_to_earlier, bucket_room = self._similar_to_earlier_blocks(signatures, bands)
+            # Bands whose key repeats within this block; only those can link
+            # a row to an earlier row of the same block
+            shared = np.zeros(bands.shape, dtype=bool)
+            for b in range(MINHASH_BANDS):
+                _, inverse, occurrences = np.unique(bands[:, b], return_inverse=True, return_counts=True)
+                shared[:, b] = occurrences[inverse.ravel()] > 1
+            shared_bands = [[] for _ in range(len(normalized))]
+            for i, b in zip(*np.nonzero(shared)):
+                shared_bands[i].append(int(b))
+            block_buckets = [dict() for _ in range(MINHASH_BANDS)]
+
+        flags = []
+        block_exact = set()
+        kept = []
+        kept_rows = []
+        for i, key in enumerate(exact.tolist()):
+            self.input_rows += 1
+            if seen[i] or key in block_exact:
+                self.exact_duplicates += 1
+                flags.append(False)
+                continue
+
+            if near:
+                duplicate = similar_to_earlier[i]
+                if not duplicate and shared_bands[i]:
+                    candidates = []
+                    for b in shared_bands[i]:
+                        block_rows = block_buckets[b].get(int(bands[i, b]))
+                        if block_rows:
+                            candidates.extend(block_rows[:bucket_room[i, b]])
+                    duplicate = bool(candidates) and self._is_near_duplicate(signatures[i], candidates)
+                if duplicate:
+                    self.near_duplicates += 1
+                    flags.append(False)
+                    continue
+                row = self._add_signature(signatures[i])
+                for b in shared_bands[i]:
+                    block_buckets[b].setdefault(int(bands[i, b]), []).append(row)
+                kept_rows.append(row)
+
+            block_exact.add(key)
+            kept.append(i)
+            self.kept_rows += 1
+            flags.append(True)
+
+        if kept:
+            self._exact, _ = _merge_sorted(self._exact, None, exact[kept])
+            if near:
+                rows = np.asarray(kept_rows, dtype=np.int32)
+                for b in range(MINHASH_BANDS):
+                    self._band_keys[b], self._band_rows[b] = _merge_sorted(
+                        self._band_keys[b], self._band_rows[b], bands[kept, b], rows)
+        return flags
+
+    def _similar_to_earlier_blocks(self, signatures, bands) -> Tuple[np.ndarray, np.ndarray]:
+        """Per row, whether a kept row from an earlier block is a near-duplicate.
+
+        Candidates are the kept rows sharing a band, the first
+        MAX_BUCKET_SIZE per band key, as a bucket that stops growing at
+        that size would hold. Also returns, per row and band, how many rows
+        of this block that bucket can still take.
+        """
+        n = len(signatures)
+        rows = []
+        candidates = []
+        room = np.empty(bands.shape, dtype=np.int64)
+        for b in range(MINHASH_BANDS):
+            starts = np.searchsorted(self._band_keys[b], bands[:, b], side="left")
+            counts = np.searchsorted(self._band_keys[b], bands[:, b], side="right") - starts
+            np.minimum(counts, MAX_BUCKET_SIZE, out=counts)
+            room[:, b] = MAX_BUCKET_SIZE - counts
+            total = int(counts.sum())
+            if total:
+                row_of = np.repeat(np.arange(n), counts)
+                offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                rows.append(row_of)
+                candidates.append(self._band_rows[b][starts[row_of] + offset])
+
+        similar = np.zeros(n, dtype=bool)
+        if not rows:
+            return similar, room
+        pairs = np.unique(np.concatenate(rows).astype(np.int64) << 32 | np.concatenate(candidates))
+        for start in range(0, len(pairs), _PAIRS_PER_STEP):
+            step = pairs[start:start + _PAIRS_PER_STEP]
+            row_of = step >> 32
+            equal = (self._signatures[step & 0xFFFFFFFF] == signatures[row_of]).mean(axis=1)
+            similar[row_of[equal >= self.near_threshold]] = True
+        return similar, room
+
+    def _add_signature(self, signature) -> int:
+        row = self._signature_count
+        if row == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+        self._signatures[row] = signature
+        self._signature_count += 1
+        return row
+
+    def _is_near_duplicate(self, signature, candidates) -> bool:
+        # Share of equal MinHash values estimates the Jaccard similarity
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        return bool(similarity.max() >= self.near_threshold)
+
+    def report(self) -> CorpusReport:
+        return CorpusReport(self.input_rows, self.kept_rows, self.exact_duplicates,
+                            self.near_duplicates, *self.chain_stats.result())
+
+
+def deduplicate(pairs: List[Tuple[Text, Text]],
+                near_threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Tuple[List[int], CorpusReport]:
+    """Indices of the pairs to keep, and the report."""
+    dedup = Deduplicator(near_threshold)
+    flags = dedup.filter([q for q, _ in pairs], [a for _, a in pairs])
+    kept = [i for i, keep in enumerate(flags) if keep]
+    return kept, dedup.report()
+
+
+def signature(near_threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Text:
+    """Fingerprint of the deduplication settings; a change invalidates compiled knowledge bases."""
+    settings = {
+        "near_threshold": near_threshold,
+        "shingle_size": SHINGLE_SIZE,
+        "bands": MINHASH_BANDS,
+        "rows_per_band": MINHASH_ROWS_PER_BAND,
+        "seed": MINHASH_SEED,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cross_file_report(csv_files: List[Text],
+                      near_threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Dict[Text, CorpusReport]:
+    """Deduplicates several CSVs as one corpus, in order; each file's report counts
+    the rows it loses to itself and to the files before it."""
+    dedup = Deduplicator(near_threshold)
+    reports = {}
+    for csv_file in csv_files:
+        before = dedup.report()
+        dedup.chain_stats = ChainStats()
+        pairs = read_pairs(csv_file)
+        dedup.filter([q for q, _ in pairs], [a for _, a in pairs])
+        after = dedup.report()
+        counts = [a - b for a, b in zip(after[:4], before[:4])]
+        reports[csv_file] = CorpusReport(*counts, *dedup.chain_stats.result())
+    return reports
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report duplicate and chained rows in knowledge-base CSVs.")
+    parser.add_argument("csv_files", nargs="+", help="CSV files with question and answer columns")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help="near-duplicate similarity threshold (1.0 = exact duplicates only)")
+    args = parser.parse_args()
+
+    reports = cross_file_report(args.csv_files, args.threshold)
+    for csv_file, report in reports.items():
+        print(f"{csv_file}: {format_report(report)}")
+    if len(reports) > 1:
+        input_rows = sum(r.input_rows for r in reports.values())
+        kept_rows = sum(r.kept_rows for r in reports.values())
+        print(f"Combined: {input_rows} rows -> {kept_rows} unique")
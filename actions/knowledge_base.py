@@ -0,0 +1,484 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import Counter, namedtuple
+from typing import Callable, Dict, List, Optional, Text
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from . import corpus, metrics
+from .retrieval import RETRIEVAL_BACKEND, Postings, build_postings, make_retriever
+
+# --- Configuration ---
+KB_CSV_FILE = "Conversation.csv"
+
+# Compiled index format. Bump ARTIFACT_VERSION whenever the layout or the
+# vectorizer settings change so old artifacts are rebuilt instead of served.
+ARTIFACT_MAGIC = b"KBINDEX\0"
+ARTIFACT_VERSION = 3
+ARTIFACT_ALIGNMENT = 64
+VECTORIZER_PARAMS = {"stop_words": "english", "ngram_range": [1, 2]}
+
+
+# One search result: row in the index, cosine similarity, and the KB pair.
+Match = namedtuple("Match", ["index", "score", "question", "answer"])
+
+
+def artifact_path_for(csv_file: Text) -> Text:
+    """Returns the compiled-index path that belongs to a knowledge-base CSV."""
+    return os.path.splitext(csv_file)[0] + ".kbindex"
+
+
+def file_sha256(path: Text) -> Text:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _make_vectorizer() -> TfidfVectorizer:
+    params = dict(VECTORIZER_PARAMS, ngram_range=tuple(VECTORIZER_PARAMS["ngram_range"]))
+    return TfidfVectorizer(**params)
+
+
+class StringTable:
+    """Read-only list of strings stored as one UTF-8 blob plus offsets.
+
+    Strings are only decoded when accessed, so a table backed by a
+    memory-mapped artifact costs nothing until it is used.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings: List[Text]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> Text:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class TermTable:
+    """Read-only term -> column mapping, stored as a hash table of column numbers.
+
+    The terms are a StringTable in column order. Slots hold the column of
+    the term hashed there (crc32, linear probing), or -1 if empty. Both
+    arrays live in the compiled artifact, so a lookup probes the memory map
+    instead of a dict every process would have to build.
+    """
+
+    def __init__(self, terms: StringTable, slots):
+        self.terms = terms
+        self.slots = slots
+        self._mask = len(slots) - 1
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary: Dict[Text, int]) -> "TermTable":
+        terms = [None] * len(vocabulary)
+        for term, col in vocabulary.items():
+            terms[col] = term
+        # At most half the slots are used, which keeps probe chains short.
+        mask = (1 << max(3, (2 * len(terms) - 1).bit_length())) - 1
+        slots = [-1] * (mask + 1)
+        for col, term in enumerate(terms):
+            slot = zlib.crc32(term.encode("utf-8")) & mask
+            while slots[slot] != -1:
+                slot = (slot + 1) & mask
+            slots[slot] = col
+        return cls(StringTable.from_list(terms), np.asarray(slots, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def get(self, term: Text, default=None):
+        """The term's column, or default if it is not in the vocabulary."""
+        encoded = term.encode("utf-8")
+        blob, offsets = self.terms.blob, self.terms.offsets
+        slot = zlib.crc32(encoded) & self._mask
+        while True:
+            col = int(self.slots[slot])
+            if col < 0:
+                return default
+            if blob[offsets[col]:offsets[col + 1]].tobytes() == encoded:
+                return col
+            slot = (slot + 1) & self._mask
+
+
+class KnowledgeBaseIndex:
+    """TF-IDF index over the knowledge-base questions.
+
+    Built once per CSV version and then only queried: each lookup vectorizes
+    the user message with the stored vocabulary and IDF weights and scores
+    it against the precomputed question matrix. The index can be saved as a
+    single binary artifact and reopened with memory-mapping.
+    """
+
+    def __init__(self, vocabulary, idf, question_matrix, questions, answers, version=None):
+        # A {term: column} dict, or a TermTable when opened from an artifact
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # Rows are L2-normalised, so a dot product with a vectorized query is
+        # its cosine similarity.
+        self.question_matrix = question_matrix
+        # Column-major postings for InvertedIndexRetriever; set when the
+        # index was opened from a compiled artifact.
+        self.postings = None
+        self.questions = questions
+        self.answers = answers
+        self.version = version
+        # Set when the index was opened from a compiled artifact.
+        self.path = None
+        self.analyzer = _make_vectorizer().build_analyzer()
+        self.retriever = None
+
+    def __len__(self):
+        return self.question_matrix.shape[0]
+
+    @classmethod
+    def from_pairs(cls, questions: List[Text], answers: List[Text], version=None) -> "KnowledgeBaseIndex":
+        """Fits the vectorizer on the questions."""
+        vectorizer = _make_vectorizer()
+        question_matrix = vectorizer.fit_transform(questions).tocsr()
+        return cls(vectorizer.vocabulary_, vectorizer.idf_, question_matrix,
+                   questions, answers, version=version)
+
+    @classmethod
+    def from_csv(cls, csv_file: Text,
+                 exclude: Optional[Callable[[Text], bool]] = None,
+                 version=None,
+                 deduplicate: bool = False) -> Optional["KnowledgeBaseIndex"]:
+        """Loads question/answer pairs from the CSV, skipping excluded and (optionally) duplicate questions."""
+        with metrics.span("kb_read_csv"):
+            df = pd.read_csv(csv_file)
+            df = df.dropna(subset=['question', 'answer'])
+
+        questions = []
+        answers = []
+        with metrics.span("kb_filter"):
+            for q, a in zip(df['question'].astype(str), df['answer'].astype(str)):
+                if exclude is not None and exclude(q):
+                    continue
+                questions.append(q)
+                answers.append(a)
+
+        if deduplicate:
+            with metrics.span("kb_dedupe"):
+                dedup = corpus.Deduplicator()
+                keep = dedup.filter(questions, answers)
+                questions = [q for q, k in zip(questions, keep) if k]
+                answers = [a for a, k in zip(answers, keep) if k]
+            print(f"Deduplicated knowledge base: {corpus.format_report(dedup.report())}")
+
+        if not questions:
+            return None
+        with metrics.span("kb_fit"):
+            return cls.from_pairs(questions, answers, version=version)
+
+    def transform(self, texts: List[Text]):
+        """Vectorizes texts exactly like the fitted TfidfVectorizer would."""
+        indptr = [0]
+        indices = []
+        counts = []
+        lookup = self.vocabulary.get
+        for text in texts:
+            terms = Counter(col for col in map(lookup, self.analyzer(text)) if col is not None)
+            indices.extend(terms.keys())
+            counts.extend(terms.values())
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix(
+            (np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(texts), len(self.idf)),
+        )
+        matrix.data *= self.idf[matrix.indices]
+        return normalize(matrix, copy=False)
+
+    def use_backend(self, backend: Text = RETRIEVAL_BACKEND):
+        """Selects the retriever used by search (see actions/retrieval.py)."""
+        self.retriever = make_retriever(backend, self)
+
+    def search(self, user_message: Text, k: int = 1) -> List[Match]:
+        """Returns the k questions most similar to the message, best first.
+
+        Only questions sharing at least one term with the message are
+        returned, so the list may be shorter than k.
+        """
+        return self.search_batch([user_message], k)[0]
+
+    def search_batch(self, user_messages: List[Text], k: int = 1) -> List[List[Match]]:
+        """Like search, for many messages vectorized and scored together."""
+        if self.retriever is None:
+            self.use_backend()
+        with metrics.span("vectorize"):
+            queries = self.transform(user_messages)
+        with metrics.span("score"):
+            results = self.retriever.search_batch(queries, k)
+        return [[Match(i, score, self.questions[i], self.answers[i]) for i, score in matches]
+                for matches in results]
+
+    # --- Compiled artifact ---
+
+    def save(self, path: Text, source_sha256: Text, filter_signature: Text = ""):
+        """Writes the index as a versioned binary artifact.
+
+        Layout: magic, format version, header length, a JSON header
+        describing every array, then the raw arrays, each aligned so they
+        can be viewed straight out of a memory map. The file is written
+        under a temporary name and renamed into place, so readers never see
+        a partial artifact.
+        """
+        matrix = self.question_matrix
+        index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+        vocabulary = self.vocabulary
+        if not isinstance(vocabulary, TermTable):
+            vocabulary = TermTable.from_vocabulary(vocabulary)
+        questions = self.questions if isinstance(self.questions, StringTable) else StringTable.from_list(self.questions)
+        answers = self.answers if isinstance(self.answers, StringTable) else StringTable.from_list(self.answers)
+        postings = self.postings if self.postings is not None else build_postings(matrix)
+
+        arrays = {
+            "idf": np.asarray(self.idf, dtype=np.float64),
+            "indptr": matrix.indptr.astype(index_dtype),
+            "indices": matrix.indices.astype(index_dtype),
+            "data": matrix.data.astype(np.float64),
+            "posting_indptr": postings.indptr.astype(index_dtype),
+            "posting_doc_ids": postings.doc_ids.astype(index_dtype),
+            "posting_weights": postings.weights.astype(np.float64),
+            "posting_max_weights": postings.max_weights.astype(np.float64),
+            "vocabulary_offsets": vocabulary.terms.offsets,
+            "vocabulary_blob": vocabulary.terms.blob,
+            "vocabulary_slots": vocabulary.slots,
+            "question_offsets": questions.offsets,
+            "question_blob": questions.blob,
+            "answer_offsets": answers.offsets,
+            "answer_blob": answers.blob,
+        }
+
+        header = {
+            "format_version": ARTIFACT_VERSION,
+            "source_sha256": source_sha256,
+            "filter": filter_signature,
+            "vectorizer": VECTORIZER_PARAMS,
+            "shape": list(matrix.shape),
+            "arrays": {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "length": len(array), "offset": offset}
+            offset = _align(offset + array.nbytes)
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix_len = len(ARTIFACT_MAGIC) + 8
+        data_start = _align(prefix_len + len(header_bytes))
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(ARTIFACT_MAGIC)
+            f.write(struct.pack("<II", ARTIFACT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.seek(data_start + header["arrays"][name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Text, source_sha256: Optional[Text] = None,
+             filter_signature: Text = "") -> Optional["KnowledgeBaseIndex"]:
+        """Opens a compiled artifact with memory-mapping.
+
+        Returns None if the artifact has another format version, other
+        vectorizer settings, another question filter, or was compiled from
+        a different source CSV.
+        """
+        artifact = read_artifact(path)
+        if artifact is None:
+            return None
+        header, arrays = artifact
+        if header["vectorizer"] != VECTORIZER_PARAMS or header.get("filter", "") != filter_signature:
+            return None
+        if source_sha256 is not None and header["source_sha256"] != source_sha256:
+            return None
+
+        index = cls(
+            TermTable(StringTable(arrays["vocabulary_blob"], arrays["vocabulary_offsets"]),
+                      arrays["vocabulary_slots"]),
+            arrays["idf"],
+            artifact_question_matrix(header, arrays),
+            StringTable(arrays["question_blob"], arrays["question_offsets"]),
+            StringTable(arrays["answer_blob"], arrays["answer_offsets"]),
+            version=header["source_sha256"],
+        )
+        index.postings = Postings(arrays["posting_indptr"], arrays["posting_doc_ids"],
+                                  arrays["posting_weights"], arrays["posting_max_weights"])
+        index.path = path
+        return index
+
+
+def _align(offset: int) -> int:
+    return (offset + ARTIFACT_ALIGNMENT - 1) // ARTIFACT_ALIGNMENT * ARTIFACT_ALIGNMENT
+
+
+def read_artifact(path: Text):
+    """Memory-maps a compiled artifact and returns (header, arrays).
+
+    The arrays are read-only views into the mapping, so processes opening
+    the same file share its pages. Returns None if the file is not an
+    artifact of the current format version.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    prefix_len = len(ARTIFACT_MAGIC) + 8
+    if buffer[:len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+        return None
+    format_version, header_len = struct.unpack("<II", buffer[len(ARTIFACT_MAGIC):prefix_len])
+    if format_version != ARTIFACT_VERSION:
+        return None
+
+    header = json.loads(buffer[prefix_len:prefix_len + header_len].decode("utf-8"))
+    data_start = _align(prefix_len + header_len)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        arrays[name] = np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]),
+                                     count=spec["length"], offset=data_start + spec["offset"])
+    return header, arrays
+
+
+def artifact_question_matrix(header, arrays):
+    """Builds the CSR question matrix over an artifact's arrays without copying them."""
+    return sp.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=tuple(header["shape"]), copy=False,
+    )
+
+
+class KnowledgeBase:
+    """Process-wide holder for the current KnowledgeBaseIndex.
+
+    The index is opened from the compiled artifact next to the CSV when that
+    artifact matches the CSV's hash, and compiled (and written back) when it
+    is missing or stale. It is reloaded when the CSV's modification time
+    changes. A new index is fully built before it replaces the old one, so
+    concurrent readers always see either the previous or the new index,
+    never a partially built one.
+    """
+
+    def __init__(self, csv_file: Text = KB_CSV_FILE,
+                 exclude: Optional[Callable[[Text], bool]] = None,
+                 artifact_file: Optional[Text] = None,
+                 backend: Text = RETRIEVAL_BACKEND,
+                 filter_signature: Text = "",
+                 deduplicate: bool = False):
+        self.csv_file = csv_file
+        self.exclude = exclude
+        self.deduplicate = deduplicate
+        # Identifies the exclude filter and deduplication settings, so
+        # changing either invalidates the artifact.
+        self.filter_signature = filter_signature + (":" + corpus.signature() if deduplicate else "")
+        self.artifact_file = artifact_file or artifact_path_for(csv_file)
+        self.backend = backend
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> Optional[KnowledgeBaseIndex]:
+        """The current index, without checking the CSV for changes."""
+        return self._index
+
+    def get(self) -> Optional[KnowledgeBaseIndex]:
+        """Returns the current index, reloading it first if the CSV changed."""
+        try:
+            mtime = os.stat(self.csv_file).st_mtime_ns
+        except OSError:
+            return self._index
+
+        if mtime != self._mtime:
+            self.reload(mtime)
+        return self._index
+
+    def reload(self, mtime=None, force: bool = False):
+        """Loads the compiled artifact, or compiles it from the CSV, and swaps it in."""
+        with self._lock:
+            if mtime is None:
+                mtime = os.stat(self.csv_file).st_mtime_ns
+            elif mtime == self._mtime:
+                # Another thread finished the reload while we waited.
+                return
+
+            try:
+                with metrics.span("kb_load"):
+                    index = self._open_or_compile(force)
+                if index is not None:
+                    index.use_backend(self.backend)
+                print(f"Loaded knowledge base with {len(index) if index else 0} questions from {self.csv_file}")
+            except Exception as e:
+                print(f"Error loading knowledge base: {e}")
+                index = self._index
+
+            # Remember the mtime even on failure so a broken CSV is not
+            # re-parsed on every fallback turn.
+            self._index = index
+            self._mtime = mtime
+
+    def _open_or_compile(self, force: bool) -> Optional[KnowledgeBaseIndex]:
+        source_sha256 = file_sha256(self.csv_file)
+
+        if not force and os.path.exists(self.artifact_file):
+            try:
+                index = KnowledgeBaseIndex.load(self.artifact_file, source_sha256, self.filter_signature)
+                if index is not None:
+                    return index
+                print(f"Compiled knowledge base {self.artifact_file} is stale, rebuilding")
+            except Exception as e:
+                print(f"Could not open compiled knowledge base {self.artifact_file}: {e}")
+
+        index = KnowledgeBaseIndex.from_csv(self.csv_file, self.exclude, version=source_sha256,
+                                            deduplicate=self.deduplicate)
+        if index is not None:
+            try:
+                index.save(self.artifact_file, source_sha256, self.filter_signature)
+                # Serve the memory-mapped copy, like every other worker will.
+                index = KnowledgeBaseIndex.load(self.artifact_file, source_sha256, self.filter_signature) or index
+            except OSError as e:
+                print(f"Warning: could not write compiled knowledge base {self.artifact_file}: {e}")
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile the knowledge-base CSV used by the fallback action.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the compiled index is up to date")
+    args = parser.parse_args()
+
+    # Importing the actions module loads (and if needed compiles) the
+    # knowledge base with the same filtering the action server uses.
+    from actions.actions import knowledge_base
+
+    if args.force:
+        knowledge_base.reload(force=True)
+    print(f"Compiled knowledge base: {knowledge_base.artifact_file}")
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Text, Tuple
+
+# --- Configuration ---
+# Port for the Prometheus scrape endpoint (GET /metrics). Off unless set:
+# the actions module is also imported by train.sh and the benchmarks, which
+# must not bind it. Bound to localhost unless METRICS_HOST says otherwise.
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or "0")
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Histogram buckets (seconds) for stage timings: 100 µs up to 10 s.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+
+
+def _format_labels(labels: Dict[Text, Text]) -> Text:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> Text:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    type = "counter"
+
+    def __init__(self, name: Text, documentation: Text, labelnames: Iterable[Text] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[Text, Dict[Text, Text], float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values."""
+
+    type = "histogram"
+
+    def __init__(self, name: Text, documentation: Text, labelnames: Iterable[Text] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[Tuple[Text, Dict[Text, Text], float]]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                samples.append((self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((self.name + "_bucket", dict(labels, le="+Inf"), count))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class CallbackMetric:
+    """Reads its samples from a callback at scrape time, for values kept elsewhere.
+
+    The callback returns a list of (labels dict, value) pairs.
+    """
+
+    def __init__(self, name: Text, documentation: Text, type: Text,
+                 callback: Callable[[], List[Tuple[Dict[Text, Text], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.callback = callback
+        _registry.append(self)
+
+    def samples(self) -> List[Tuple[Text, Dict[Text, Text], float]]:
+        return [(self.name, labels, value) for labels, value in self.callback()]
+
+
+# --- Fallback action metrics ---
+
+STAGE_SECONDS = Histogram(
+    "fallback_stage_seconds",
+    "Time spent in each stage of the fallback action.",
+    labelnames=("stage",),
+)
+TURNS = Counter(
+    "fallback_turns_total",
+    "Fallback turns by how they were answered (greeting, goodbye, knowledge_base, canned).",
+    labelnames=("outcome",),
+)
+MATCHES = Counter(
+    "fallback_matches_total",
+    "Similarity searches by whether the best match cleared the threshold.",
+    labelnames=("result",),
+)
+SEARCH_FAILURES = Counter(
+    "fallback_search_failures_total",
+    "Searches that produced no answer because of an error, a timeout or a saturated pool.",
+    labelnames=("reason",),
+)
+
+
+@contextmanager
+def span(stage: Text):
+    """Times the enclosed block into fallback_stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def render() -> Text:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port: int = METRICS_PORT, host: Text = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serves /metrics from a daemon thread; a no-op if already running or port is 0."""
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            # e.g. several action server processes on one host
+            print(f"Warning: could not start metrics endpoint on {host}:{port}: {e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _server = server
+        print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
@@ -0,0 +1,189 @@
+import os
+from collections import namedtuple
+from typing import List, Optional, Text, Tuple
+
+import numpy as np
+
+# --- Configuration ---
+# Which retriever the fallback action uses: "brute_force", "inverted_index"
+# or "sharded" (see actions/sharding.py).
+RETRIEVAL_BACKEND = os.environ.get("KB_RETRIEVAL_BACKEND", "inverted_index")
+
+# Relative slack on score upper bounds, so floating-point rounding in the
+# bound sums never prunes a document that would actually reach the top-k.
+_BOUND_SLACK = 1e-9
+
+# Term-major copy of the question matrix: per term, the questions containing
+# it (sorted) and their weights, and the term's largest weight.
+Postings = namedtuple("Postings", ["indptr", "doc_ids", "weights", "max_weights"])
+
+
+def build_postings(question_matrix) -> Postings:
+    postings = question_matrix.tocsc()
+    postings.sort_indices()
+    max_weights = np.zeros(postings.shape[1])
+    non_empty = np.flatnonzero(np.diff(postings.indptr))
+    if len(non_empty):
+        max_weights[non_empty] = np.maximum.reduceat(postings.data, postings.indptr[non_empty])
+    return Postings(postings.indptr, postings.indices, postings.data, max_weights)
+
+
+def top_k(doc_ids, scores, k: int) -> List[Tuple[int, float]]:
+    """Returns the k best (doc_id, score) pairs, highest score first.
+
+    Ties are broken by the lower document id, which is the document
+    numpy's argmax would pick, so every retriever agrees on the best match.
+    """
+    if len(scores) == 0 or k <= 0:
+        return []
+    if len(scores) > k:
+        kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= kth_score
+        doc_ids, scores = doc_ids[keep], scores[keep]
+    order = np.lexsort((doc_ids, -scores))[:k]
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
+
+
+class BruteForceRetriever:
+    """Scores queries against every question with one sparse matrix product.
+
+    This is the baseline the other retrievers must agree with.
+    """
+
+    name = "brute_force"
+
+    def __init__(self, question_matrix):
+        self.question_matrix = question_matrix
+
+    @classmethod
+    def from_index(cls, index):
+        return cls(index.question_matrix)
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        return self.search_batch(query, k)[0]
+
+    def search_batch(self, queries, k: int = 1) -> List[List[Tuple[int, float]]]:
+        """Returns the top-k (doc_id, score) pairs for every row of queries."""
+        scores = (queries @ self.question_matrix.T).tocsr()
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            doc_ids, row_scores = scores.indices[start:end], scores.data[start:end]
+            positive = row_scores > 0
+            results.append(top_k(doc_ids[positive], row_scores[positive], k))
+        return results
+
+
+class InvertedIndexRetriever(BruteForceRetriever):
+    """Term-at-a-time search over TF-IDF postings with MaxScore pruning.
+
+    Each term's postings list holds the questions containing it and their
+    weights, plus the largest weight in the list. Query terms are processed
+    in order of their maximum possible contribution. Once the k-th best
+    partial score exceeds what the remaining terms could add to an unseen
+    question, no new question can enter the top-k: the remaining terms only
+    update surviving candidates, and candidates that can no longer reach
+    the k-th score are dropped. Only questions that share a term with the
+    query are ever touched, and the result equals BruteForceRetriever's.
+
+    Batches of several queries still use the single matrix product, which
+    beats pruning each query separately.
+
+    The postings are read from the compiled artifact when the index has
+    them, so worker processes share their pages; otherwise they are built
+    from the question matrix.
+    """
+
+    name = "inverted_index"
+
+    def __init__(self, question_matrix, postings: Optional[Postings] = None):
+        super().__init__(question_matrix)
+        if postings is None:
+            postings = build_postings(question_matrix)
+        self.indptr, self.doc_ids, self.weights, self.max_weights = postings
+
+    @classmethod
+    def from_index(cls, index):
+        return cls(index.question_matrix, index.postings)
+
+    def _postings(self, term):
+        start, end = self.indptr[term], self.indptr[term + 1]
+        return self.doc_ids[start:end], self.weights[start:end]
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        terms = query.indices
+        query_weights = query.data
+        if len(terms) == 0 or k <= 0:
+            return []
+
+        bounds = query_weights * self.max_weights[terms]
+        order = np.argsort(-bounds, kind="stable")
+        terms, query_weights, bounds = terms[order], query_weights[order], bounds[order]
+        # remaining[i]: the most terms i.. can add to any single question.
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1], 0.0) * (1 + _BOUND_SLACK)
+
+        doc_ids = np.empty(0, dtype=np.int64)
+        scores = np.empty(0)
+        threshold = 0.0
+
+        i = 0
+        # Essential terms: an unseen question could still make the top-k.
+        while i < len(terms) and (len(doc_ids) < k or remaining[i] >= threshold):
+            term_docs, term_weights = self._postings(terms[i])
+            merged, inverse = np.unique(np.concatenate([doc_ids, term_docs]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([scores, term_weights * query_weights[i]]),
+                                 minlength=len(merged))
+            doc_ids = merged
+            if len(scores) >= k:
+                threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            i += 1
+
+        # Non-essential terms: only refine candidates that can still qualify.
+        while i < len(terms) and len(doc_ids) > k:
+            alive = scores + remaining[i] >= threshold
+            doc_ids, scores = doc_ids[alive], scores[alive]
+
+            term_docs, term_weights = self._postings(terms[i])
+            if len(term_docs):
+                pos = np.minimum(np.searchsorted(term_docs, doc_ids), len(term_docs) - 1)
+                hit = term_docs[pos] == doc_ids
+                scores[hit] += term_weights[pos[hit]] * query_weights[i]
+                if len(scores) >= k:
+                    threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            i += 1
+
+        # Fewer than k candidates left: finish their scores exactly.
+        for term, weight in zip(terms[i:], query_weights[i:]):
+            term_docs, term_weights = self._postings(term)
+            if len(term_docs):
+                pos = np.minimum(np.searchsorted(term_docs, doc_ids), len(term_docs) - 1)
+                hit = term_docs[pos] == doc_ids
+                scores[hit] += term_weights[pos[hit]] * weight
+
+        return top_k(doc_ids, scores, k)
+
+    def search_batch(self, queries, k: int = 1) -> List[List[Tuple[int, float]]]:
+        if queries.shape[0] == 1:
+            return [self.search(queries, k)]
+        return super().search_batch(queries, k)
+
+
+RETRIEVERS = {
+    BruteForceRetriever.name: BruteForceRetriever,
+    InvertedIndexRetriever.name: InvertedIndexRetriever,
+}
+
+
+def make_retriever(backend: Text, index):
+    """Builds the named retriever over a KnowledgeBaseIndex."""
+    if backend == "sharded":
+        # Imported lazily: the sharded retriever reopens the compiled artifact
+        # in its worker processes, which needs the knowledge-base module.
+        from .sharding import ShardedRetriever
+        return ShardedRetriever.from_index(index)
+
+    try:
+        retriever_class = RETRIEVERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown retrieval backend '{backend}', expected one of {sorted(RETRIEVERS) + ['sharded']}")
+    return retriever_class.from_index(index)
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Text, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from .knowledge_base import artifact_question_matrix, read_artifact
+from .retrieval import BruteForceRetriever, top_k
+
+# --- Configuration ---
+KB_SEARCH_SHARDS = int(os.environ.get("KB_SEARCH_SHARDS", str(os.cpu_count() or 1)))
+
+# --- Worker process state ---
+# Each worker holds the whole question matrix, but when it comes from the
+# compiled artifact it is a memory-mapped view, so all workers share one
+# copy of the pages. Shards are row ranges of that matrix.
+_worker_matrix = None
+_worker_shards = {}
+
+
+def _init_worker(artifact_file: Optional[Text], version: Optional[Text], question_matrix):
+    global _worker_matrix
+    if artifact_file is not None:
+        artifact = read_artifact(artifact_file)
+        if artifact is None or artifact[0]["source_sha256"] != version:
+            raise RuntimeError(f"Compiled knowledge base {artifact_file} changed while starting shard workers")
+        _worker_matrix = artifact_question_matrix(*artifact)
+    else:
+        _worker_matrix = question_matrix
+
+
+def _shard_matrix(start: int, end: int):
+    """Rows start:end of the worker's matrix, as views rather than a copy."""
+    shard = _worker_shards.get((start, end))
+    if shard is None:
+        indptr = _worker_matrix.indptr
+        first, last = indptr[start], indptr[end]
+        shard = sp.csr_matrix(
+            (_worker_matrix.data[first:last], _worker_matrix.indices[first:last], indptr[start:end + 1] - first),
+            shape=(end - start, _worker_matrix.shape[1]), copy=False,
+        )
+        _worker_shards[(start, end)] = shard
+    return shard
+
+
+def _search_shard(start: int, end: int, queries, k: int) -> List[List[Tuple[int, float]]]:
+    results = BruteForceRetriever(_shard_matrix(start, end)).search_batch(queries, k)
+    return [[(doc_id + start, score) for doc_id, score in matches] for matches in results]
+
+
+def _ping():
+    return os.getpid()
+
+
+class ShardedRetriever:
+    """Splits the question matrix into row shards searched by worker processes.
+
+    Every shard returns its local top-k and the results are merged with the
+    same ordering as the single-process retrievers, so the matches are
+    identical to BruteForceRetriever's. Workers reopen the compiled
+    artifact themselves instead of receiving the matrix with each call;
+    only the vectorized queries are sent per search.
+    """
+
+    name = "sharded"
+
+    def __init__(self, question_matrix, shards: int = KB_SEARCH_SHARDS,
+                 artifact_file: Optional[Text] = None, version: Optional[Text] = None):
+        n_rows = question_matrix.shape[0]
+        shards = max(1, min(shards, n_rows))
+        bounds = np.linspace(0, n_rows, shards + 1).astype(int)
+        self.shards = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        # Without an artifact the matrix is sent once per worker at startup.
+        initargs = (artifact_file, version, None if artifact_file else question_matrix)
+        self.pool = ProcessPoolExecutor(
+            max_workers=len(self.shards),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+        # Shut the workers down once a reloaded index replaces this one.
+        weakref.finalize(self, self.pool.shutdown, False)
+        # Start the workers now rather than on the first fallback turn.
+        for _ in self.shards:
+            self.pool.submit(_ping)
+
+    @classmethod
+    def from_index(cls, index, shards: int = KB_SEARCH_SHARDS) -> "ShardedRetriever":
+        return cls(index.question_matrix, shards, artifact_file=index.path, version=index.version)
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        return self.search_batch(query, k)[0]
+
+    def search_batch(self, queries, k: int = 1) -> List[List[Tuple[int, float]]]:
+        futures = [self.pool.submit(_search_shard, start, end, queries, k) for start, end in self.shards]
+        shard_results = [future.result() for future in futures]
+
+        results = []
+        for row in range(queries.shape[0]):
+            matches = [match for shard in shard_results for match in shard[row]]
+            doc_ids = np.array([doc_id for doc_id, _ in matches], dtype=np.int64)
+            scores = np.array([score for _, score in matches])
+            results.append(top_k(doc_ids, scores, k))
+        return results
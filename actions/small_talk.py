@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Text
+
+import yaml
+
+# --- Configuration ---
+SMALL_TALK_CONFIG = os.environ.get(
+    "SMALL_TALK_CONFIG", os.path.join(os.path.dirname(__file__), "small_talk.yml")
+)
+
+DEFAULT_PATTERNS = {
+    "greeting": [
+        'hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening',
+        'what\'s up', 'how are you', 'howdy', 'greetings', 'sup', 'yo'
+    ],
+    "goodbye": [
+        'bye', 'goodbye', 'see you', 'take care', 'farewell', 'later',
+        'catch you later', 'have a good day', 'good night'
+    ],
+}
+
+
+class KeywordMatcher:
+    """Matches any of a set of keywords or phrases as whole words.
+
+    All patterns are compiled into one regex alternation, longest first,
+    so a check is a single scan of the text. Word boundaries keep short
+    patterns such as "yo" or "hi" from matching inside "you" or "this".
+    """
+
+    def __init__(self, patterns: Iterable[Text]):
+        self.patterns = sorted({p.strip().lower() for p in patterns if p and p.strip()},
+                               key=lambda p: (-len(p), p))
+        if self.patterns:
+            alternation = "|".join(re.escape(p) for p in self.patterns)
+            self._regex = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+        else:
+            self._regex = None
+
+    def __call__(self, text: Text) -> bool:
+        return self._regex is not None and self._regex.search(text) is not None
+
+
+def load_patterns(path: Text = SMALL_TALK_CONFIG) -> Dict[Text, List[Text]]:
+    """Reads the pattern lists, falling back to the built-in defaults."""
+    patterns = dict(DEFAULT_PATTERNS)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = yaml.safe_load(f) or {}
+            for key, values in loaded.items():
+                if values is None:
+                    values = []
+                elif not isinstance(values, list):
+                    # `greet: hello` is one pattern, not one per character
+                    values = [values]
+                patterns[key] = [str(v) for v in values]
+        except (OSError, yaml.YAMLError, AttributeError) as e:
+            print(f"Error reading small-talk patterns from {path}, using defaults: {e}")
+    return patterns
+
+
+_patterns = load_patterns()
+is_greeting = KeywordMatcher(_patterns["greeting"])
+is_goodbye = KeywordMatcher(_patterns["goodbye"])
+
+
+def is_small_talk(question: Text) -> bool:
+    """Greetings and goodbyes are answered directly, so they are kept out of the knowledge base."""
+    return is_greeting(question) or is_goodbye(question)
+
+
+def signature() -> Text:
+    """Fingerprint of the active patterns; a change invalidates compiled knowledge bases."""
+    active = {"greeting": is_greeting.patterns, "goodbye": is_goodbye.patterns}
+    return hashlib.sha256(json.dumps(active, sort_keys=True).encode("utf-8")).hexdigest()
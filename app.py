@@ -4,19 +4,30 @@ import json
 from datetime import datetime
 import uuid
 import time
+import os
+
+from chat_store import MessageStore
+from pre_router import PreRouter, PRE_ROUTER_CSV, PRE_ROUTER_ENABLED, format_stats
+from rasa_client import create_session, check_server, stream_messages, HealthMonitor, WEBHOOK_TIMEOUT, HEALTH_CHECK_TIMEOUT
 
 # --- CONFIGURATION ---
 
 # Use the actual Hugging Face Space URL for your Rasa backend
-RASA_SERVER_URL = "https://adarshdivase-Rasabackend.hf.space"
+# (override with RASA_SERVER_URL, e.g. to point at stub_rasa_server.py)
+RASA_SERVER_URL = os.environ.get("RASA_SERVER_URL", "https://adarshdivase-Rasabackend.hf.space")
 RASA_WEBHOOK_URL = f"{RASA_SERVER_URL}/webhooks/rest/webhook"
 
+# Number of most recent messages rendered on each rerun; older ones are
+# loaded on demand in steps of the same size
+HISTORY_WINDOW = 50
+
 # GitHub repository link
 GITHUB_REPO_LINK = "https://github.com/adarshdivase/FUTURE_ML_05"
 
 # Initialize session state variables if they don't exist
+# Bounded per-session history; older messages spill to a local file
 if 'messages' not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = MessageStore()
 
 if 'user_id' not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
@@ -24,8 +35,34 @@ if 'user_id' not in st.session_state:
 if 'button_clicked' not in st.session_state:
     st.session_state.button_clicked = None
 
+if 'history_window' not in st.session_state:
+    st.session_state.history_window = HISTORY_WINDOW
+
+# Render bot messages as they arrive instead of after the whole reply
+if 'stream_responses' not in st.session_state:
+    st.session_state.stream_responses = True
+
 # --- HELPER FUNCTIONS ---
 
+@st.cache_resource
+def get_http_session():
+    """One keep-alive session shared by every rerun and every user session"""
+    return create_session()
+
+
+@st.cache_resource
+def get_health_monitor():
+    """Background health checks, so rendering never waits on the network"""
+    session = get_http_session()
+    return HealthMonitor(lambda: check_server(session, RASA_SERVER_URL))
+
+
+@st.cache_resource
+def get_pre_router():
+    """Exact-match KB index answering verbatim questions without Rasa; built once per process"""
+    return PreRouter.from_csv(PRE_ROUTER_CSV) if PRE_ROUTER_ENABLED else None
+
+
 def send_message_to_rasa(message, user_id):
     """Send message to Rasa server and get response"""
     try:
@@ -34,18 +71,11 @@ def send_message_to_rasa(message, user_id):
             "message": message
         }
         
-        # Add headers for better compatibility
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
         # Use the Hugging Face Space URL
-        response = requests.post(
+        response = get_http_session().post(
             RASA_WEBHOOK_URL,
             json=payload,
-            headers=headers,
-            timeout=30
+            timeout=WEBHOOK_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -63,26 +93,36 @@ def send_message_to_rasa(message, user_id):
         return [{"text": "Sorry, the request timed out. Please try again."}]
     except requests.exceptions.ConnectionError:
         st.error(f"Connection Error: Could not connect to Rasa at {RASA_WEBHOOK_URL}")
+        # Let the header catch up with the outage on the next rerun
+        get_health_monitor().request_refresh()
         return [{"text": "Sorry, I'm currently unavailable. Please try again later."}]
     except requests.exceptions.RequestException as e:
         st.error(f"Request Error: {e}")
         return [{"text": "Sorry, I'm having trouble connecting. Please try again later."}]
 
 
-def check_rasa_server():
-    """Check if Rasa server is running"""
+def stream_message_to_rasa(message, user_id):
+    """Yield bot messages from Rasa one at a time, as the server produces them"""
     try:
-        # First try the /status endpoint
-        response = requests.get(f"{RASA_SERVER_URL}/status", timeout=10)
-        if response.status_code == 200:
-            return True
-        
-        # If status endpoint fails, try the main endpoint
-        response = requests.get(RASA_SERVER_URL, timeout=10)
-        return response.status_code == 200
-        
-    except requests.exceptions.RequestException:
-        return False
+        yield from stream_messages(get_http_session(), RASA_WEBHOOK_URL, message, user_id)
+    except requests.exceptions.Timeout:
+        st.error("Request timed out. The server might be busy.")
+        yield {"text": "Sorry, the request timed out. Please try again."}
+    except requests.exceptions.ConnectionError:
+        st.error(f"Connection Error: Could not connect to Rasa at {RASA_WEBHOOK_URL}")
+        get_health_monitor().request_refresh()
+        yield {"text": "Sorry, I'm currently unavailable. Please try again later."}
+    except requests.exceptions.RequestException as e:
+        st.error(f"Request Error: {e}")
+        yield {"text": "Sorry, I'm having trouble connecting. Please try again later."}
+    except ValueError as e:
+        st.error(f"Could not parse streamed response: {e}")
+        yield {"text": "Sorry, I'm having trouble connecting. Please check the logs."}
+
+
+def check_rasa_server():
+    """Check if Rasa server is running (blocking; the page header uses the health monitor)"""
+    return get_health_monitor().refresh()
 
 
 def test_webhook():
@@ -93,11 +133,10 @@ def test_webhook():
             "message": "hello"
         }
         
-        response = requests.post(
+        response = get_http_session().post(
             RASA_WEBHOOK_URL,
             json=test_payload,
-            headers={"Content-Type": "application/json"},
-            timeout=10
+            timeout=HEALTH_CHECK_TIMEOUT
         )
         
         return response.status_code == 200, response.status_code, response.text
@@ -106,53 +145,110 @@ def test_webhook():
         return False, 0, str(e)
 
 
-def process_message(message):
-    """Process a user message and get bot response"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
+def add_bot_response(response):
+    """Add one Rasa response to the chat and return the messages it produced"""
+    messages = st.session_state.messages
+    received_at = time.time()
+    new_messages = []
+    
+    # Handle text responses
+    if 'text' in response and response['text']:
+        new_messages.append(messages.append(
+            "assistant",
+            response['text'],
+            created=received_at
+        ))
+    
+    # Handle other response types (images, buttons, etc.)
+    if 'image' in response:
+        new_messages.append(messages.append(
+            "assistant",
+            f"[Image: {response['image']}]",
+            created=received_at,
+            type="image",
+            image_url=response['image']
+        ))
+    
+    if 'buttons' in response:
+        new_messages.append(messages.append(
+            "assistant",
+            "[Quick Reply Buttons]",
+            created=received_at,
+            type="buttons",
+            buttons=response['buttons']
+        ))
     
+    return new_messages
+
+
+def process_message(message, live_container=None):
+    """Process a user message and get bot response
+    
+    With streaming enabled and a live_container given, each message is
+    rendered into the container as soon as it arrives.
+    """
     # Add user message to chat
-    st.session_state.messages.append({
-        "role": "user", 
-        "content": message, 
-        "timestamp": timestamp
-    })
+    user_message = st.session_state.messages.append("user", message)
     
-    # Get bot response
-    rasa_responses = send_message_to_rasa(message, st.session_state.user_id)
+    live = live_container is not None and st.session_state.stream_responses
+    if live:
+        with live_container:
+            render_message(len(st.session_state.messages) - 1, user_message)
     
-    if not rasa_responses:
-        rasa_responses = [{"text": "Sorry, I didn't receive a response. Please try again."}]
+    # Get bot response: verbatim KB questions are answered locally, the
+    # rest goes to Rasa
+    pre_router = get_pre_router()
+    answer = pre_router.route(message) if pre_router is not None else None
+    forward_started = time.perf_counter()
+    if answer is not None:
+        rasa_responses = [{"text": answer}]
+    elif st.session_state.stream_responses:
+        rasa_responses = stream_message_to_rasa(message, st.session_state.user_id)
+    else:
+        rasa_responses = send_message_to_rasa(message, st.session_state.user_id)
     
     # Process each response
+    received = False
     for response in rasa_responses:
-        response_timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # Handle text responses
-        if 'text' in response and response['text']:
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": response['text'], 
-                "timestamp": response_timestamp
-            })
-        
-        # Handle other response types (images, buttons, etc.)
-        if 'image' in response:
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": f"[Image: {response['image']}]", 
-                "timestamp": response_timestamp,
-                "type": "image",
-                "image_url": response['image']
-            })
+        received = True
+        new_messages = add_bot_response(response)
+        if live:
+            first_index = len(st.session_state.messages) - len(new_messages)
+            with live_container:
+                for offset, new_message in enumerate(new_messages):
+                    render_message(first_index + offset, new_message)
+    
+    if pre_router is not None and answer is None:
+        pre_router.record_forward(time.perf_counter() - forward_started)
+    
+    if not received:
+        add_bot_response({"text": "Sorry, I didn't receive a response. Please try again."})
+
+
+def render_message(i, message):
+    """Render one chat message; i keeps widget keys unique"""
+    with st.chat_message(message.role):
+        # Handle different message types
+        if message.type == "image":
+            st.image(message.image_url)
+        elif message.type == "buttons":
+            st.markdown("**Quick replies:**")
+            for j, button in enumerate(message.buttons or []):
+                button_key = f"btn_{i}_{j}_{button.get('payload', '')}"
+                if st.button(button['title'], key=button_key):
+                    process_message(button['payload'], chat_container)
+                    st.rerun()
+        else:
+            st.markdown(message.content)
         
-        if 'buttons' in response:
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": "[Quick Reply Buttons]", 
-                "timestamp": response_timestamp,
-                "type": "buttons",
-                "buttons": response['buttons']
-            })
+        if message.timestamp:
+            st.caption(message.timestamp)
+
+
+def reset_chat():
+    """Forget the conversation and everything derived from it"""
+    st.session_state.messages.clear()
+    st.session_state.history_window = HISTORY_WINDOW
 
 
 # --- STREAMLIT UI ---
@@ -167,7 +263,10 @@ col1, col2 = st.columns([3, 1])
 with col1:
     st.markdown("### Chat with your Rasa assistant")
 with col2:
-    if check_rasa_server():
+    server_online = get_health_monitor().online
+    if server_online is None:
+        st.info("⏳ Checking server...")
+    elif server_online:
         st.success("🟢 Server Online")
     else:
         st.error("🔴 Server Offline")
@@ -176,33 +275,26 @@ with col2:
 chat_container = st.container()
 
 with chat_container:
-    for i, message in enumerate(st.session_state.messages):
-        with st.chat_message(message["role"]):
-            # Handle different message types
-            if message.get("type") == "image":
-                st.image(message.get("image_url"))
-            elif message.get("type") == "buttons":
-                st.markdown("**Quick replies:**")
-                for j, button in enumerate(message.get("buttons", [])):
-                    button_key = f"btn_{i}_{j}_{button.get('payload', '')}"
-                    if st.button(button['title'], key=button_key):
-                        process_message(button['payload'])
-                        st.rerun()
-            else:
-                st.markdown(message["content"])
-            
-            if message.get("timestamp"):
-                st.caption(message["timestamp"])
+    # Only the most recent messages are rendered, so a rerun costs the same
+    # however long the conversation gets
+    messages = st.session_state.messages
+    first_shown = max(0, len(messages) - st.session_state.history_window)
+    if first_shown > 0:
+        if st.button(f"⬆️ Load older messages ({first_shown} hidden)", key="load_older_messages"):
+            st.session_state.history_window += HISTORY_WINDOW
+            st.rerun()
+    for i, message in enumerate(messages.range(first_shown, len(messages)), start=first_shown):
+        render_message(i, message)
 
 # Handle button clicks
 if st.session_state.button_clicked:
-    process_message(st.session_state.button_clicked)
+    process_message(st.session_state.button_clicked, chat_container)
     st.session_state.button_clicked = None
     st.rerun()
 
 # Chat input
 if prompt := st.chat_input("Type your message here..."):
-    process_message(prompt)
+    process_message(prompt, chat_container)
     st.rerun()
 
 # --- SIDEBAR ---
@@ -211,13 +303,19 @@ with st.sidebar:
 
     st.subheader("Chat Controls")
     if st.button("Clear Chat History"):
-        st.session_state.messages = []
+        reset_chat()
         st.rerun()
     if st.button("New Session"):
         st.session_state.user_id = str(uuid.uuid4())
-        st.session_state.messages = []
+        reset_chat()
         st.rerun()
 
+    st.checkbox(
+        "Stream responses",
+        key="stream_responses",
+        help="Show each bot message as soon as Rasa sends it (uses the REST channel's stream mode)"
+    )
+
     st.subheader("Connection Status")
     st.info(f"Backend: {RASA_SERVER_URL}")
     st.info(f"Webhook: {RASA_WEBHOOK_URL}")
@@ -243,6 +341,14 @@ with st.sidebar:
                 st.error(f"❌ Webhook failed! Status: {status_code}")
                 st.error(f"Response: {response_text}")
 
+    st.subheader("Pre-Router")
+    pre_router = get_pre_router()
+    if pre_router is not None:
+        st.caption(f"{len(pre_router)} KB questions answered without Rasa")
+        st.caption(format_stats(pre_router.stats()))
+    else:
+        st.caption("Disabled")
+
     st.subheader("Debug Info")
     st.text(f"User ID: {st.session_state.user_id[:8]}...")
     st.text(f"Messages: {len(st.session_state.messages)}")
@@ -250,7 +356,7 @@ with st.sidebar:
     if st.button("Export Chat"):
         chat_data = {
             "user_id": st.session_state.user_id, 
-            "messages": st.session_state.messages,
+            "messages": [message.to_dict() for message in st.session_state.messages],
             "timestamp": datetime.now().isoformat()
         }
         st.download_button(
@@ -301,7 +407,7 @@ with st.expander("🔍 Advanced Debug"):
         # Test 1: Basic server connectivity
         st.write("1. Testing server connectivity...")
         try:
-            response = requests.get(RASA_SERVER_URL, timeout=5)
+            response = get_http_session().get(RASA_SERVER_URL, timeout=HEALTH_CHECK_TIMEOUT)
             st.success(f"✅ Server accessible: {response.status_code}")
         except Exception as e:
             st.error(f"❌ Server connection failed: {e}")
@@ -309,7 +415,7 @@ with st.expander("🔍 Advanced Debug"):
         # Test 2: Status endpoint
         st.write("2. Testing status endpoint...")
         try:
-            response = requests.get(f"{RASA_SERVER_URL}/status", timeout=5)
+            response = get_http_session().get(f"{RASA_SERVER_URL}/status", timeout=HEALTH_CHECK_TIMEOUT)
             if response.status_code == 200:
                 st.success("✅ Status endpoint working")
                 st.json(response.json())
@@ -322,11 +428,10 @@ with st.expander("🔍 Advanced Debug"):
         st.write("3. Testing webhook endpoint...")
         try:
             test_payload = {"sender": "debug_user", "message": "test connection"}
-            response = requests.post(
+            response = get_http_session().post(
                 RASA_WEBHOOK_URL, 
                 json=test_payload, 
-                headers={"Content-Type": "application/json"},
-                timeout=10
+                timeout=HEALTH_CHECK_TIMEOUT
             )
             if response.status_code == 200:
                 st.success("✅ Webhook responding correctly")
@@ -338,8 +443,8 @@ with st.expander("🔍 Advanced Debug"):
             st.error(f"❌ Webhook error: {e}")
 
 # --- REAL-TIME DEBUGGING ---
-if st.session_state.messages:
+if len(st.session_state.messages):
     with st.expander("🐛 Real-time Debug - Latest Messages"):
         st.write("**Last 3 messages:**")
-        for msg in st.session_state.messages[-3:]:
-            st.json(msg)
+        for msg in st.session_state.messages.tail(3):
+            st.json(msg.to_dict())
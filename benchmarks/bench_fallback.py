@@ -0,0 +1,292 @@
+"""Microbenchmarks for the fallback action's similarity matcher.
+
+Measures, for Conversation.csv and synthetically scaled knowledge bases:
+
+- cold start: compiling the index from the CSV, and reopening the compiled
+  artifact (what every action-server worker does at startup)
+- warm latency: p50/p95/p99 of single-message searches
+- throughput: single-message searches per second, and batched searches
+- memory: peak Python/numpy allocations while compiling, artifact size,
+  and the private resident memory that opening the artifact and setting up
+  each backend add (vocabulary, postings, ...)
+
+Compile time and compile peak memory come from separate compiles, since
+tracemalloc slows down allocation-heavy code several times over.
+
+for each retrieval backend. Results are written to a JSON file; pass
+--baseline to compare against an earlier run and fail on regressions.
+
+Examples:
+    python -m benchmarks.bench_fallback --sizes conversation,10k --output bench.json
+    python -m benchmarks.bench_fallback --sizes conversation,10k,100k,1M --baseline bench.json
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import scipy
+import sklearn
+
+from actions import small_talk
+from actions.knowledge_base import KB_CSV_FILE, KnowledgeBase
+from actions.retrieval import RETRIEVERS
+from benchmarks.stats import percentile
+
+# --- CONFIGURATION ---
+DEFAULT_SIZES = "conversation,10k"
+DEFAULT_QUERIES = 500
+DEFAULT_TOLERANCE = 0.20
+SEED = 13
+
+# Metrics where a larger value is a regression; all others are "higher is better"
+LOWER_IS_BETTER = ("_ms", "_mb", "_bytes")
+# Memory changes smaller than this are allocator noise, not regressions
+NOISE_FLOOR_MB = 1.0
+
+
+def parse_size(size):
+    """'conversation' or a row count such as 10k / 100k / 1M"""
+    if size == "conversation":
+        return None
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(size[-1].lower(), 1)
+    return int(float(size.rstrip("kKmM")) * multiplier)
+
+
+def load_pairs(csv_file):
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        return [(row["question"], row["answer"]) for row in csv.DictReader(f)
+                if row.get("question") and row.get("answer")]
+
+
+def make_synthetic_csv(pairs, rows, path, rng):
+    """Write a KB of `rows` distinct questions built by recombining real ones"""
+    vocabulary = sorted({word for question, _ in pairs for word in question.split()})
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["", "question", "answer"])
+        for i in range(rows):
+            question, answer = pairs[rng.randrange(len(pairs))]
+            words = question.split()
+            rng.shuffle(words)
+            words += rng.sample(vocabulary, 3)
+            writer.writerow([i, " ".join(words), answer])
+
+
+def make_queries(pairs, count, rng):
+    """Realistic fallback messages: KB questions with a word dropped and a word added, plus noise"""
+    vocabulary = sorted({word for question, _ in pairs for word in question.split()})
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            words = pairs[rng.randrange(len(pairs))][0].split()
+            if len(words) > 2:
+                words.pop(rng.randrange(len(words)))
+            words.insert(rng.randrange(len(words) + 1), rng.choice(vocabulary))
+        else:
+            words = rng.sample(vocabulary, 5)
+        queries.append(" ".join(words))
+    return queries
+
+
+def resident_mb():
+    """Private resident memory of this process in MB, or None without /proc (Linux only).
+
+    Pages of the memory-mapped artifact are file-backed and shared between
+    workers, so they are not counted; copies a worker makes of them are.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_growth(before):
+    after = resident_mb()
+    return None if before is None or after is None else round(after - before, 2)
+
+
+def bench_cold(csv_file, work_dir):
+    """Compile from CSV (timed, then again for peak memory), then reopen the compiled artifact"""
+    artifact = os.path.join(work_dir, "bench.kbindex")
+    if os.path.exists(artifact):
+        os.remove(artifact)
+    kb = KnowledgeBase(csv_file, exclude=small_talk.is_small_talk, artifact_file=artifact,
+                       filter_signature=small_talk.signature(), deduplicate=True)
+
+    start = time.perf_counter()
+    index = kb._open_or_compile(force=True)
+    compile_ms = (time.perf_counter() - start) * 1000
+    rows = len(index)
+    del index
+
+    tracemalloc.start()
+    kb._open_or_compile(force=True)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    before = resident_mb()
+    start = time.perf_counter()
+    reopened = kb._open_or_compile(force=False)
+    open_ms = (time.perf_counter() - start) * 1000
+
+    return reopened, {
+        "rows": rows,
+        "compile_ms": round(compile_ms, 2),
+        "open_artifact_ms": round(open_ms, 2),
+        "open_resident_mb": resident_growth(before),
+        "compile_peak_mb": round(peak / 2 ** 20, 2),
+        "artifact_bytes": os.path.getsize(artifact),
+    }
+
+
+def bench_backend(index, backend, queries):
+    """Setup cost, warm single-message latency, throughput, and batched throughput"""
+    gc.collect()
+    before = resident_mb()
+    start = time.perf_counter()
+    index.use_backend(backend)
+    setup_ms = (time.perf_counter() - start) * 1000
+
+    # First search pays any lazy setup; it is the "first query" cost
+    start = time.perf_counter()
+    index.search(queries[0])
+    first_query_ms = (time.perf_counter() - start) * 1000
+    setup_resident_mb = resident_growth(before)
+
+    latencies = []
+    start_all = time.perf_counter()
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - start)
+    single_elapsed = time.perf_counter() - start_all
+    latencies.sort()
+
+    start = time.perf_counter()
+    index.search_batch(queries)
+    batch_elapsed = time.perf_counter() - start
+
+    return {
+        "setup_ms": round(setup_ms, 2),
+        "setup_resident_mb": setup_resident_mb,
+        "first_query_ms": round(first_query_ms, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "throughput_qps": round(len(queries) / single_elapsed, 1),
+        "batch_throughput_qps": round(len(queries) / batch_elapsed, 1),
+    }
+
+
+def run(sizes, backends, query_count):
+    rng = random.Random(SEED)
+    pairs = load_pairs(KB_CSV_FILE)
+    queries = make_queries(pairs, query_count, rng)
+    results = {}
+
+    work_dir = tempfile.mkdtemp(prefix="bench_fallback_")
+    try:
+        for size in sizes:
+            rows = parse_size(size)
+            if rows is None:
+                csv_file = KB_CSV_FILE
+            else:
+                csv_file = os.path.join(work_dir, f"kb_{size}.csv")
+                print(f"Generating synthetic KB with {rows} rows...")
+                make_synthetic_csv(pairs, rows, csv_file, rng)
+
+            print(f"[{size}] compiling...")
+            index, cold = bench_cold(csv_file, work_dir)
+            results[f"{size}/cold"] = cold
+            print(f"[{size}] {cold}")
+
+            for backend in backends:
+                print(f"[{size}] searching with {backend}...")
+                warm = bench_backend(index, backend, queries)
+                results[f"{size}/{backend}"] = warm
+                print(f"[{size}] {backend}: {warm}")
+            del index
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return (metric, baseline, current, change) for every metric that regressed beyond tolerance"""
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(case, {}).get(metric)
+            if (not isinstance(old, (int, float)) or not isinstance(value, (int, float))
+                    or not old or metric == "rows"):
+                continue
+            if metric.endswith("_mb") and abs(value - old) < NOISE_FLOOR_MB:
+                continue
+            change = (value - old) / old
+            worse = change > tolerance if metric.endswith(LOWER_IS_BETTER) else change < -tolerance
+            if worse:
+                regressions.append((f"{case}.{metric}", old, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fallback similarity matcher.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma-separated KBs: 'conversation' and/or row counts like 10k,100k,1M")
+    parser.add_argument("--backends", default=",".join(RETRIEVERS),
+                        help="comma-separated retrieval backends to measure")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="queries per measurement")
+    parser.add_argument("--output", default="bench_fallback.json", help="where to write the results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative change before a metric counts as regressed")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes.split(","), args.backends.split(","), args.queries)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "scikit-learn": sklearn.__version__,
+            "queries": args.queries,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}:")
+            for name, old, new, change in regressions:
+                print(f"  {name}: {old} -> {new} ({change:+.1%})")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
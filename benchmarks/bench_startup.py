@@ -0,0 +1,149 @@
+"""Time to first response of a freshly started Rasa server.
+
+Starts the server (a Docker container, or any local command), then polls
+until GET / answers (server ready) and until the REST webhook returns a
+reply to a message (first response), and stops it again. Repeats for
+--runs cold starts and reports the timings.
+
+Examples:
+    # The image built from this repo's Dockerfile
+    python -m benchmarks.bench_startup --image my-rasa-bot --runs 5
+
+    # Compare with the plain rasa entrypoint (no model cache)
+    python -m benchmarks.bench_startup --image my-rasa-bot --entrypoint rasa --runs 5
+
+    # A local command, e.g. the stub server
+    python -m benchmarks.bench_startup --command "python stub_rasa_server.py --port 5005"
+"""
+import argparse
+import json
+import shlex
+import subprocess
+import sys
+import time
+
+import requests
+
+# --- CONFIGURATION ---
+DEFAULT_URL = "http://localhost:5005"
+WEBHOOK_PATH = "/webhooks/rest/webhook"
+DEFAULT_MESSAGE = "hello"
+DEFAULT_TIMEOUT = 600
+POLL_INTERVAL = 0.1
+CONTAINER_PORT = 5005
+
+
+def start_server(args):
+    """Start the server; returns a function that stops it"""
+    if args.command:
+        process = subprocess.Popen(shlex.split(args.command), stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+
+        def stop():
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        return stop
+
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    command = ["docker", "run", "-d", "--rm", "-p", f"{port}:{CONTAINER_PORT}"]
+    if args.entrypoint:
+        command += ["--entrypoint", args.entrypoint]
+    command += [args.image] + shlex.split(args.server_args)
+    container = subprocess.run(command, check=True, capture_output=True, text=True).stdout.strip()
+
+    def stop():
+        subprocess.run(["docker", "rm", "-f", container], capture_output=True)
+    return stop
+
+
+def wait_for(check, deadline):
+    """Poll check() until it returns True; False if the deadline passes first"""
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(POLL_INTERVAL)
+    return False
+
+
+def measure_start(args, session):
+    url = args.url.rstrip("/")
+    start = time.perf_counter()
+    deadline = start + args.timeout
+    stop = start_server(args)
+    try:
+        ready = wait_for(lambda: session.get(url + "/", timeout=1).ok, deadline)
+        ready_s = time.perf_counter() - start if ready else None
+
+        def answered():
+            response = session.post(url + WEBHOOK_PATH, json={"sender": "bench-startup", "message": args.message},
+                                    timeout=args.timeout)
+            return response.ok and isinstance(response.json(), list)
+
+        first = ready and wait_for(answered, deadline)
+        first_s = time.perf_counter() - start if first else None
+    finally:
+        stop()
+    return {
+        "ready_s": None if ready_s is None else round(ready_s, 3),
+        "first_response_s": None if first_s is None else round(first_s, 3),
+    }
+
+
+def summarize(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        "min": values[0],
+        "median": values[len(values) // 2],
+        "max": values[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to first response after a Rasa server starts.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--image", help="Docker image to start")
+    target.add_argument("--command", help="local command that starts the server")
+    parser.add_argument("--entrypoint", help="override the image's entrypoint (e.g. rasa)")
+    parser.add_argument("--server-args", default="run -m models --enable-api",
+                        help="arguments passed to the image's entrypoint")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"where the server listens (default: {DEFAULT_URL})")
+    parser.add_argument("--message", default=DEFAULT_MESSAGE, help="message sent to get the first response")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to measure")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds to wait for each start")
+    parser.add_argument("--json", dest="json_output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # No retries: rasa_client's connect retries back off for seconds, which
+    # would hide when the server actually came up
+    session = requests.Session()
+    runs = []
+    for n in range(1, args.runs + 1):
+        result = measure_start(args, session)
+        runs.append(result)
+        print(f"Run {n}: ready after {result['ready_s']} s, first response after {result['first_response_s']} s")
+
+    report = {
+        "target": args.image or args.command,
+        "runs": runs,
+        "ready_s": summarize(r["ready_s"] for r in runs),
+        "first_response_s": summarize(r["first_response_s"] for r in runs),
+    }
+    print(f"\nReady:          {report['ready_s']}")
+    print(f"First response: {report['first_response_s']}")
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_output}")
+    return 0 if all(r["first_response_s"] is not None for r in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Compare training profiles (config.yml vs config_fast.yml) on a CPU.
+
+For each profile, on the same train/test split of the NLU data:
+
+- training time of `rasa train` (NLU and core) and the model's size
+- inference latency: p50/p95 of parsing the test messages with the model
+  loaded in-process, plus the time to load it
+- intent F1 (weighted and macro average) from `rasa test nlu` on the
+  held-out test split
+
+GPUs are hidden from TensorFlow so the numbers reflect a CPU-only machine.
+Results are printed as a table and written to a JSON file.
+
+Examples:
+    python -m benchmarks.bench_training
+    python -m benchmarks.bench_training --profiles fast --data data --output training.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+from benchmarks.stats import percentile
+
+# --- CONFIGURATION ---
+PROFILES = {
+    "default": "config.yml",
+    "fast": "config_fast.yml",
+}
+DEFAULT_DATA = "data"
+DEFAULT_DOMAIN = "domain.yml"
+TRAINING_FRACTION = 0.8
+LATENCY_REPEATS = 3
+
+CPU_ONLY_ENV = {
+    "CUDA_VISIBLE_DEVICES": "-1",
+    "RASA_TELEMETRY_ENABLED": "false",
+    "TF_CPP_MIN_LOG_LEVEL": "2",
+}
+
+
+def rasa(*args, log_file):
+    """Run a rasa CLI command, logging its output; returns elapsed seconds"""
+    start = time.perf_counter()
+    with open(log_file, "a", encoding="utf-8") as log:
+        result = subprocess.run(["rasa", *args], stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"'rasa {' '.join(args)}' failed; see {log_file}")
+    return time.perf_counter() - start
+
+
+def yaml_files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                  for name in names if name.endswith((".yml", ".yaml")))
+
+
+def core_files(data):
+    """Training files with stories or rules; they are used as-is, only the NLU data is split"""
+    files = []
+    for path in yaml_files(data):
+        with open(path, "r", encoding="utf-8") as f:
+            content = yaml.safe_load(f) or {}
+        if "stories" in content or "rules" in content:
+            files.append(path)
+    return files
+
+
+def split_nlu(data, work_dir, log_file):
+    """Split the NLU data into train and test sets; returns (train file, test file)"""
+    out = os.path.join(work_dir, "split")
+    rasa("data", "split", "nlu", "--nlu", data, "--training-fraction", str(TRAINING_FRACTION),
+         "--out", out, log_file=log_file)
+    return os.path.join(out, "training_data.yml"), os.path.join(out, "test_data.yml")
+
+
+def test_messages(test_file):
+    from rasa.shared.nlu.training_data.loading import load_data
+
+    return [example.get("text") for example in load_data(test_file).intent_examples]
+
+
+def measure_inference(model_path, messages):
+    """Model load time and per-message parse latency, in process"""
+    from rasa.core.agent import Agent
+
+    start = time.perf_counter()
+    agent = Agent.load(model_path)
+    load_s = time.perf_counter() - start
+
+    async def parse_all():
+        await agent.parse_message(messages[0])  # first call builds TensorFlow's graph
+        latencies = []
+        for _ in range(LATENCY_REPEATS):
+            for message in messages:
+                start = time.perf_counter()
+                await agent.parse_message(message)
+                latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+    latencies = asyncio.run(parse_all())
+    return {
+        "model_load_s": round(load_s, 2),
+        "parse_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "parse_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def intent_f1(results_dir):
+    with open(os.path.join(results_dir, "intent_report.json"), "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {
+        "intent_f1_weighted": round(report["weighted avg"]["f1-score"], 4),
+        "intent_f1_macro": round(report["macro avg"]["f1-score"], 4),
+    }
+
+
+def bench_profile(name, config, domain, train_files, test_file, messages, work_dir, log_file):
+    models = os.path.join(work_dir, "models")
+    print(f"[{name}] training with {config}...")
+    train_s = rasa("train", "--config", config, "--domain", domain, "--data", *train_files,
+                   "--out", models, "--fixed-model-name", name, "--force", log_file=log_file)
+    model_path = os.path.join(models, f"{name}.tar.gz")
+
+    print(f"[{name}] testing...")
+    results_dir = os.path.join(work_dir, f"results_{name}")
+    rasa("test", "nlu", "--model", model_path, "--nlu", test_file, "--out", results_dir, log_file=log_file)
+
+    print(f"[{name}] measuring inference latency...")
+    result = {
+        "config": config,
+        "train_s": round(train_s, 1),
+        "model_mb": round(os.path.getsize(model_path) / 2 ** 20, 2),
+    }
+    result.update(measure_inference(model_path, messages))
+    result.update(intent_f1(results_dir))
+    print(f"[{name}] {result}")
+    return result
+
+
+def print_table(results):
+    columns = ["train_s", "model_mb", "model_load_s", "parse_p50_ms", "parse_p95_ms",
+               "intent_f1_weighted", "intent_f1_macro"]
+    width = max(len(c) for c in columns)
+    print("\n" + "".ljust(width) + "".join(name.rjust(12) for name in results))
+    for column in columns:
+        print(column.ljust(width) + "".join(str(r[column]).rjust(12) for r in results.values()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and compare Rasa config profiles on a CPU.")
+    parser.add_argument("--profiles", default=",".join(PROFILES),
+                        help=f"comma-separated profiles to compare ({', '.join(PROFILES)})")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="training data file or directory")
+    parser.add_argument("--domain", default=DEFAULT_DOMAIN, help="domain file or directory")
+    parser.add_argument("--output", default="bench_training.json", help="where to write the results")
+    parser.add_argument("--keep", action="store_true", help="keep the trained models and rasa logs")
+    args = parser.parse_args(argv)
+
+    # Before anything imports TensorFlow, so in-process inference is CPU-only too
+    os.environ.update(CPU_ONLY_ENV)
+    work_dir = tempfile.mkdtemp(prefix="bench_training_")
+    log_file = os.path.join(work_dir, "rasa.log")
+    results = {}
+    keep = args.keep
+    try:
+        train_file, test_file = split_nlu(args.data, work_dir, log_file)
+        train_files = [train_file] + core_files(args.data)
+        messages = test_messages(test_file)
+        print(f"Split NLU data: {len(messages)} test messages held out")
+
+        for name in args.profiles.split(","):
+            results[name] = bench_profile(name, PROFILES.get(name, name), args.domain, train_files,
+                                          test_file, messages, work_dir, log_file)
+    except Exception:
+        keep = True  # for the rasa log
+        raise
+    finally:
+        if keep:
+            print(f"Models and logs kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(results)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "training_fraction": TRAINING_FRACTION,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
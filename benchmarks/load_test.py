@@ -0,0 +1,232 @@
+"""Load generator for the Rasa REST webhook.
+
+Replays user messages against /webhooks/rest/webhook at a fixed
+concurrency and (optionally) a target request rate, using the same HTTP
+client as app.py, and reports latency percentiles, throughput and error
+rate.
+
+Messages come from a JSON-lines log (one object per line with a
+"message" or "text" field, optionally "sender") or from the question
+column of a knowledge-base CSV.
+
+Examples:
+    # Offline, against the bundled stub server
+    python -m benchmarks.load_test --stub --csv Conversation.csv -n 2000 -c 16
+
+    # Against a running Rasa server, 20 requests/s, streaming mode
+    python -m benchmarks.load_test --url http://localhost:5005 --log messages.jsonl --rate 20 --stream
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from rasa_client import create_session, stream_messages, WEBHOOK_TIMEOUT
+from stub_rasa_server import start_in_background
+from benchmarks.stats import percentile
+
+# --- CONFIGURATION ---
+DEFAULT_URL = "http://localhost:5005"
+WEBHOOK_PATH = "/webhooks/rest/webhook"
+
+
+def load_log_messages(path):
+    """(sender, message) pairs from a JSON-lines message log"""
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            text = entry.get("message") or entry.get("text")
+            if text:
+                messages.append((entry.get("sender"), str(text)))
+    return messages
+
+
+def load_csv_messages(path, column="question"):
+    """(sender, message) pairs from a knowledge-base CSV column"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [(None, row[column]) for row in csv.DictReader(f) if row.get(column)]
+
+
+class LoadTest:
+    """Sends `total` requests from `concurrency` workers, paced to `rate` per second (0 = as fast as possible)"""
+
+    def __init__(self, url, messages, total, concurrency, rate=0.0, stream=False):
+        self.webhook_url = url.rstrip("/") + WEBHOOK_PATH
+        self.messages = messages
+        self.total = total
+        self.concurrency = concurrency
+        self.rate = rate
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.first_message_latencies = []
+        self.errors = {}
+
+    def _session(self):
+        # requests sessions are not thread-safe; one pooled session per worker
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = create_session()
+        return session
+
+    def _send(self, sender, message):
+        """Send one message; returns (latency, time to first bot message)"""
+        session = self._session()
+        start = time.perf_counter()
+        if self.stream:
+            first = None
+            for _ in stream_messages(session, self.webhook_url, message, sender):
+                if first is None:
+                    first = time.perf_counter() - start
+            return time.perf_counter() - start, first
+
+        response = session.post(
+            self.webhook_url,
+            json={"sender": sender, "message": message},
+            timeout=WEBHOOK_TIMEOUT
+        )
+        response.raise_for_status()
+        response.json()
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+
+    def _worker(self, jobs, started_at):
+        for n, (sender, message) in jobs:
+            if self.rate > 0:
+                delay = started_at + n / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                latency, first = self._send(sender or f"loadtest-{uuid.uuid4().hex[:8]}", message)
+                with self._lock:
+                    self.latencies.append(latency)
+                    if first is not None:
+                        self.first_message_latencies.append(first)
+            except Exception as e:
+                name = type(e).__name__
+                with self._lock:
+                    self.errors[name] = self.errors.get(name, 0) + 1
+
+    def run(self):
+        requests_to_send = itertools.islice(itertools.cycle(self.messages), self.total)
+        jobs = iter(enumerate(requests_to_send))
+        job_lock = threading.Lock()
+
+        def next_jobs():
+            while True:
+                with job_lock:
+                    job = next(jobs, None)
+                if job is None:
+                    return
+                yield job
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in range(self.concurrency):
+                pool.submit(self._worker, next_jobs(), started_at)
+        return self.report(time.perf_counter() - started_at)
+
+    def report(self, wall_time):
+        latencies = sorted(self.latencies)
+        first = sorted(self.first_message_latencies)
+        failed = sum(self.errors.values())
+        completed = len(latencies)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            "url": self.webhook_url,
+            "mode": "stream" if self.stream else "blocking",
+            "requests": completed + failed,
+            "concurrency": self.concurrency,
+            "target_rate": self.rate or None,
+            "wall_time_s": round(wall_time, 3),
+            "throughput_rps": round(completed / wall_time, 2) if wall_time > 0 else None,
+            "error_rate": round(failed / (completed + failed), 4) if completed + failed else 0.0,
+            "errors": self.errors,
+            "latency_ms": {
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(latencies[-1] if latencies else None),
+                "mean": ms(sum(latencies) / completed if completed else None),
+            },
+            "first_message_ms": {
+                "p50": ms(percentile(first, 50)),
+                "p95": ms(percentile(first, 95)),
+                "p99": ms(percentile(first, 99)),
+            },
+        }
+
+
+def print_report(report):
+    print(f"\nTarget:      {report['url']} ({report['mode']})")
+    print(f"Requests:    {report['requests']} at concurrency {report['concurrency']}"
+          + (f", target {report['target_rate']} req/s" if report["target_rate"] else ""))
+    print(f"Wall time:   {report['wall_time_s']} s")
+    print(f"Throughput:  {report['throughput_rps']} req/s")
+    print(f"Error rate:  {report['error_rate'] * 100:.2f}% {report['errors'] or ''}")
+    latency = report["latency_ms"]
+    print(f"Latency ms:  p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  max={latency['max']}")
+    if report["mode"] == "stream":
+        first = report["first_message_ms"]
+        print(f"First msg ms: p50={first['p50']}  p95={first['p95']}  p99={first['p99']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Rasa REST webhook.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="JSON-lines message log to replay")
+    source.add_argument("--csv", help="knowledge-base CSV whose questions are replayed")
+    parser.add_argument("--column", default="question", help="CSV column to replay (default: question)")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"Rasa server URL (default: {DEFAULT_URL})")
+    parser.add_argument("-n", "--requests", type=int, default=500, help="total requests to send")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="parallel clients")
+    parser.add_argument("--rate", type=float, default=0.0, help="target requests per second (0 = unlimited)")
+    parser.add_argument("--stream", action="store_true", help="use the REST channel's stream mode")
+    parser.add_argument("--stub", action="store_true", help="start the bundled stub server and test against it")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="stub server delay per bot message (s)")
+    parser.add_argument("--stub-messages", type=int, default=2, help="stub server bot messages per reply")
+    parser.add_argument("--json", dest="json_output", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    messages = load_log_messages(args.log) if args.log else load_csv_messages(args.csv, args.column)
+    if not messages:
+        print("No messages to replay.")
+        return 1
+
+    url = args.url
+    stub = None
+    if args.stub:
+        stub = start_in_background(messages=args.stub_messages, delay=args.stub_delay)
+        url = stub.url
+        print(f"Started stub Rasa server at {url}")
+
+    print(f"Replaying {args.requests} requests drawn from {len(messages)} messages...")
+    try:
+        report = LoadTest(url, messages, args.requests, args.concurrency, args.rate, args.stream).run()
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    print_report(report)
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_output}")
+    return 0 if report["error_rate"] < 1.0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
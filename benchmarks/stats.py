@@ -0,0 +1,9 @@
+import math
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list; None if it is empty"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+import weakref
+from array import array
+from collections import deque
+from datetime import datetime
+
+# --- CONFIGURATION ---
+
+# Messages kept in memory per chat session; older ones spill to disk
+MESSAGE_STORE_CAPACITY = 200
+
+# Where spilled history is written (one append-only JSON-lines file per session)
+SPILL_DIRECTORY = os.environ.get("CHAT_SPILL_DIR", tempfile.gettempdir())
+
+TIME_FORMAT = "%H:%M:%S"
+
+
+class ChatMessage:
+    """One chat message. Slotted, with an epoch timestamp formatted only for display."""
+
+    __slots__ = ("role", "content", "created", "type", "image_url", "buttons")
+
+    def __init__(self, role, content, created=None, type=None, image_url=None, buttons=None):
+        self.role = role
+        self.content = content
+        self.created = time.time() if created is None else created
+        self.type = type
+        self.image_url = image_url
+        self.buttons = buttons
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.created).strftime(TIME_FORMAT)
+
+    def to_dict(self):
+        """The message in the app's original export format"""
+        data = {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+        if self.type is not None:
+            data["type"] = self.type
+        if self.image_url is not None:
+            data["image_url"] = self.image_url
+        if self.buttons is not None:
+            data["buttons"] = self.buttons
+        return data
+
+    def to_record(self):
+        return [self.role, self.content, self.created, self.type, self.image_url, self.buttons]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MessageStore:
+    """Per-session chat history with a bounded memory footprint.
+
+    The newest `capacity` messages live in a ring buffer. When it is full,
+    the oldest message is appended to a JSON-lines spill file, and only its
+    byte offset stays in memory, so any message can still be read back by
+    index and the full history can be exported. Indices are stable: message
+    i stays message i after it spills. The spill file is deleted when the
+    store is cleared or garbage-collected.
+    """
+
+    def __init__(self, capacity=MESSAGE_STORE_CAPACITY, spill_directory=SPILL_DIRECTORY):
+        self.capacity = capacity
+        self.spill_directory = spill_directory
+        self._buffer = deque()
+        self._spill_offsets = array("q")
+        self._spill_path = None
+        self._finalizer = None
+
+    def __len__(self):
+        return len(self._spill_offsets) + len(self._buffer)
+
+    @property
+    def first_in_memory(self):
+        """Index of the oldest message still held in memory"""
+        return len(self._spill_offsets)
+
+    def append(self, role, content, **fields):
+        message = ChatMessage(role, content, **fields)
+        if len(self._buffer) >= self.capacity:
+            self._spill(self._buffer.popleft())
+        self._buffer.append(message)
+        return message
+
+    def _spill(self, message):
+        if self._spill_path is None:
+            os.makedirs(self.spill_directory, exist_ok=True)
+            self._spill_path = os.path.join(self.spill_directory, f"chat_{uuid.uuid4().hex}.jsonl")
+            self._finalizer = weakref.finalize(self, _remove_file, self._spill_path)
+        with open(self._spill_path, "ab") as f:
+            self._spill_offsets.append(f.tell())
+            f.write(json.dumps(message.to_record()).encode("utf-8") + b"\n")
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("message index out of range")
+        if i >= self.first_in_memory:
+            return self._buffer[i - self.first_in_memory]
+        with open(self._spill_path, "rb") as f:
+            f.seek(self._spill_offsets[i])
+            return ChatMessage.from_record(json.loads(f.readline()))
+
+    def range(self, start, stop):
+        """Messages start..stop-1; spilled ones are read back in one pass over the file"""
+        start = max(0, start)
+        stop = min(len(self), stop)
+        messages = []
+        if start < self.first_in_memory:
+            with open(self._spill_path, "rb") as f:
+                f.seek(self._spill_offsets[start])
+                for _ in range(start, min(stop, self.first_in_memory)):
+                    messages.append(ChatMessage.from_record(json.loads(f.readline())))
+        first = max(start, self.first_in_memory) - self.first_in_memory
+        last = stop - self.first_in_memory
+        messages.extend(self._buffer[j] for j in range(first, last))
+        return messages
+
+    def tail(self, n):
+        return self.range(len(self) - n, len(self))
+
+    def __iter__(self):
+        """Every message, oldest first, streaming spilled ones from disk"""
+        if self._spill_path is not None:
+            with open(self._spill_path, "rb") as f:
+                for line in f:
+                    yield ChatMessage.from_record(json.loads(line))
+        yield from list(self._buffer)
+
+    def clear(self):
+        self._buffer.clear()
+        self._spill_offsets = array("q")
+        if self._finalizer is not None:
+            self._finalizer()
+        self._spill_path = None
+        self._finalizer = None
@@ -1,16 +1,116 @@
+import argparse
+import filecmp
+import hashlib
+import json
+import multiprocessing
 import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import yaml
 import shutil
 import stat
+import tempfile
 import time
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from actions.corpus import Deduplicator, format_report
 
 # --- Configuration ---
 CSV_FILE = "Conversation.csv"
 PROJECT_DIRECTORY = "rasa_chatbot"
 
+# Rows read and written per step; peak memory is bounded by this, not by the CSV size.
+# Kept modest because PyYAML builds a node graph for every row of a chunk it dumps.
+CHUNK_SIZE = 5000
+
+# Target number of intents. Questions are clustered into this many retrieval
+# intents (kb_cluster_N); a ResponseSelector then picks the exact answer
+# within the cluster. 0 generates one intent per CSV row instead.
+INTENT_CLUSTERS = 100
+
+# Clustering settings: passes over the CSV, k-means mini-batch size, and
+# the size of the hashed TF-IDF feature space. k-means keeps dense float32
+# centers of k x CLUSTER_FEATURES (a few copies while fitting), so this sets
+# the memory that grows with --intents: about 280 MB peak for the whole run
+# at 100 intents and 850 MB at the most clusters fit() allows (CHUNK_SIZE),
+# measured on a 60k-row CSV.
+CLUSTER_EPOCHS = 3
+CLUSTER_BATCH_SIZE = 1024
+CLUSTER_FEATURES = 2 ** 15
+CLUSTER_SEED = 42
+
+# Cluster size limits: a cluster with more than CLUSTER_MAX_SIZE_FACTOR times
+# the average size is split with a second k-means over its rows, and one
+# with fewer than CLUSTER_MIN_SIZE rows is dissolved into its neighbours.
+# Each round costs a few passes over the CSV.
+CLUSTER_MAX_SIZE_FACTOR = 3.0
+CLUSTER_MIN_SIZE = 2
+CLUSTER_BALANCE_ROUNDS = 2
+
+# Remembers which intent/response names each CSV row was generated under, so
+# regenerating after a CSV edit keeps every other row's names (and files) as
+# they were. Rows are identified by a hash of their question and answer.
+# JSON lines: a header, then one [key, pair name, cluster] line per row in
+# CSV order, so it is written and read a row at a time.
+MANIFEST_FILE = ".generation_manifest.jsonl"
+MANIFEST_VERSION = 2
+
+# New rows join the cluster of their most similar existing row; when more
+# than this share of the rows is new, everything is re-clustered instead.
+RECLUSTER_THRESHOLD = 0.2
+
+# libyaml's C emitter and parser, when PyYAML was built with them
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Worker processes that turn chunks into YAML text while the main process
+# reads the CSV and writes files; 0 emits everything in this process.
+EMIT_WORKERS = 0
+EMIT_MAX_PENDING_PER_WORKER = 4
+
+# Drop rows whose question repeats (exactly or nearly) an earlier one, so
+# duplicates do not inflate the training data. See actions/corpus.py.
+# Off by default: it keeps about 450 bytes per row for the whole run.
+DEDUPLICATE_QUESTIONS = False
+
+# Split the domain and training data into one file per intent group
+# (domain/<group>.yml, data/nlu/<group>.yml, data/rules/<group>.yml), each
+# with at most this many rows; 0 writes single domain.yml/nlu.yml/rules.yml.
+SHARD_MAX_ROWS = 0
+
+SESSION_CONFIG = {
+    "session_expiration_time": 60,
+    "carry_over_slots_to_new_session": True
+}
+
 # --- Helper Functions ---
 
+def replace_if_changed(tmp_path, path):
+    """Moves tmp_path over path, unless path already has the same bytes.
+
+    Unchanged files keep their mtime, so Rasa's fingerprinting sees them as
+    untouched. Returns True if path was rewritten.
+    """
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_if_changed(path, content):
+    """Writes content to path unless the file already holds exactly that."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(content)
+    return replace_if_changed(path + ".tmp", path)
+
+
 def create_directory_structure():
     """Creates the standard Rasa directory structure."""
     if not os.path.exists(PROJECT_DIRECTORY):
@@ -25,8 +125,10 @@ def create_directory_structure():
     os.makedirs(actions_dir, exist_ok=True)
     os.makedirs(models_dir, exist_ok=True)
     
-    with open(os.path.join(actions_dir, "__init__.py"), "w") as f:
-        pass
+    init_path = os.path.join(actions_dir, "__init__.py")
+    if not os.path.exists(init_path):
+        with open(init_path, "w") as f:
+            pass
     print("Directory structure created.")
 
 
@@ -45,13 +147,15 @@ def create_static_files():
         ],
         "policies": [{"name": "RulePolicy"}],
     }
+    if INTENT_CLUSTERS > 0:
+        # Picks the answer within each kb_cluster_N retrieval intent
+        config_content["pipeline"].append({"name": "ResponseSelector", "epochs": 100})
     
     config_path = os.path.join(PROJECT_DIRECTORY, "config.yml")
-    with open(config_path, "w", encoding="utf-8") as f:
-        yaml.dump(config_content, f, sort_keys=False, allow_unicode=True)
+    write_if_changed(config_path, dump_yaml(config_content))
 
     # Create credentials.yml
-    credentials_content = {
+    credentials_content = [
         "# This file contains the credentials for the voice & chat platforms",
         "# which your bot is using.",
         "# https://rasa.com/docs/rasa/messaging-and-voice-channels/",
@@ -84,15 +188,13 @@ def create_static_files():
         "# speech-to-text service in case you are using Rasa X with voice assistants.",
         "#rasa:",
         "#  url: \"http://localhost:5002/api\""
-    }
+    ]
     
     credentials_path = os.path.join(PROJECT_DIRECTORY, "credentials.yml")
-    with open(credentials_path, "w", encoding="utf-8") as f:
-        for line in credentials_content:
-            f.write(line + "\n")
+    write_if_changed(credentials_path, "".join(line + "\n" for line in credentials_content))
     
     # Create endpoints.yml
-    endpoints_content = {
+    endpoints_content = [
         "# This file contains the different endpoints your bot can use.",
         "# Server where the models are pulled from.",
         "# https://rasa.com/docs/rasa/model-storage#fetching-models-from-a-server",
@@ -128,115 +230,753 @@ def create_static_files():
         "#  username: username",
         "#  password: password",
         "#  queue: queue"
-    }
+    ]
     
     endpoints_path = os.path.join(PROJECT_DIRECTORY, "endpoints.yml")
-    with open(endpoints_path, "w", encoding="utf-8") as f:
-        for line in endpoints_content:
-            f.write(line + "\n")
+    write_if_changed(endpoints_path, "".join(line + "\n" for line in endpoints_content))
     
     print("Static files (config, credentials, endpoints) created.")
 
 
-def generate_rasa_data_files():
-    """Reads the CSV and generates nlu, domain, and rules files."""
+def read_qa_chunks(deduplicator=None, keep_rows=None):
+    """Yields cleaned (question, answer) DataFrame chunks with their CSV row numbers as index.
+
+    With a Deduplicator, rows it rejects are dropped. keep_rows (sorted CSV
+    row numbers) keeps only those rows, so later passes can reuse the first
+    pass's deduplication without redoing it.
+    """
+    reader = pd.read_csv(CSV_FILE, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False)
+    for chunk in reader:
+        if "question" in chunk.columns and "answer" in chunk.columns:
+            chunk = chunk[["question", "answer"]]
+        elif len(chunk.columns) >= 2:
+            chunk = chunk.iloc[:, :2]
+        else:
+            raise ValueError("CSV file must have at least 2 columns (question, answer)")
+        chunk.columns = ["question", "answer"]
+
+        question = chunk["question"].str.strip()
+        answer = chunk["answer"].str.strip()
+        keep = (question != "") & (answer != "") & (question != "nan") & (answer != "nan")
+        chunk = pd.DataFrame({"question": question[keep], "answer": answer[keep]})
+        if keep_rows is not None and len(chunk):
+            # Chunks cover consecutive row numbers, so their kept rows are one slice
+            start, stop = np.searchsorted(keep_rows, [chunk.index[0], chunk.index[-1] + 1])
+            chunk = chunk.loc[keep_rows[start:stop]]
+        if deduplicator is not None:
+            # A boolean mask: an empty list would select zero columns, not zero rows
+            chunk = chunk[np.asarray(deduplicator.filter(chunk["question"], chunk["answer"]), dtype=bool)]
+        yield chunk
+
+
+def row_keys(chunk, seen):
+    """Content hash of each row; identical repeated rows are told apart by occurrence count."""
+    keys = []
+    for question, answer in zip(chunk["question"], chunk["answer"]):
+        digest = hashlib.sha1(f"{question}\0{answer}".encode("utf-8")).hexdigest()[:16]
+        seen[digest] += 1
+        keys.append(f"{digest}:{seen[digest]}")
+    return keys
+
+
+def load_manifest():
+    """The manifest from the previous generation, with rows as {key: (pair name, cluster)}, or None."""
+    path = os.path.join(PROJECT_DIRECTORY, MANIFEST_FILE)
     try:
-        df = pd.read_csv(CSV_FILE)
-        # Ensure we have the right column names
-        if len(df.columns) < 2:
-            print("Error: CSV file must have at least 2 columns (question, answer)")
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.loads(f.readline())
+            if (not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION
+                    or manifest.get("csv_file") != CSV_FILE):
+                return None
+            rows = {}
+            for line in f:
+                key, name, cluster = json.loads(line)
+                rows[key] = (name, cluster)
+    except (OSError, ValueError):
+        return None
+    manifest["rows"] = rows
+    return manifest
+
+
+def write_manifest(manifest):
+    """Writes the manifest header and its rows; returns True if the file changed."""
+    path = os.path.join(PROJECT_DIRECTORY, MANIFEST_FILE)
+    header = {key: value for key, value in manifest.items() if key != "rows"}
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        manifest["rows"].write_to(f)
+    return replace_if_changed(path + ".tmp", path)
+
+
+class ManifestRows:
+    """[key, pair name, cluster] for each row, in CSV order, spooled to a temporary file.
+
+    Rows are appended while the CSV is read and read back in the same order
+    alongside later passes over it, so they are never all held in memory.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8", dir=PROJECT_DIRECTORY)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, key, name, cluster):
+        self._file.write(json.dumps([key, name, cluster], separators=(",", ":")) + "\n")
+        self._count += 1
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+
+    def relabel(self, cluster_of):
+        """A copy with each row's cluster replaced by cluster_of(key, cluster); closes this one."""
+        relabeled = ManifestRows()
+        for key, name, cluster in self:
+            relabeled.append(key, name, cluster_of(key, cluster))
+        self.close()
+        return relabeled
+
+    def write_to(self, f):
+        self._file.flush()
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, f)
+
+    def close(self):
+        self._file.close()
+
+
+class IntentClusterer:
+    """Groups questions into a target number of intents without holding the CSV in memory.
+
+    Questions are embedded with TF-IDF over hashed word unigrams and
+    bigrams, so no vocabulary has to be built: one pass over the CSV counts
+    document frequencies, then MiniBatchKMeans is fitted over a few more
+    streamed passes. Near-duplicate and paraphrased questions share terms
+    and land in the same cluster.
+
+    k-means alone leaves some clusters huge and others nearly empty, so the
+    clusters are then rebalanced (see CLUSTER_MAX_SIZE_FACTOR): oversized
+    ones are split and tiny ones dissolved, keeping at most n_clusters.
+    labels() then caps every cluster at max_size rows.
+    """
+
+    def __init__(self, n_clusters):
+        self.n_clusters = n_clusters
+        self.vectorizer = HashingVectorizer(
+            n_features=CLUSTER_FEATURES, alternate_sign=False, norm=None, dtype=np.float32,
+            stop_words="english", ngram_range=(1, 2)
+        )
+        self.idf = None
+        self.centers = None
+        self._center_norms = None
+        # Set by fit: the size limit and what rebalancing did
+        self.max_size = None
+        self.split = 0
+        self.dissolved = 0
+
+    def _tfidf(self, questions):
+        counts = self.vectorizer.transform(questions)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def fit_idf(self, chunks):
+        """Counts document frequencies over the chunks yielded by chunks(); returns the row count."""
+        document_frequency = np.zeros(CLUSTER_FEATURES)
+        total = 0
+        for chunk in chunks():
+            counts = self.vectorizer.transform(chunk["question"])
+            document_frequency += np.bincount(counts.indices, minlength=CLUSTER_FEATURES)
+            total += len(chunk)
+        # Same smoothed idf as sklearn's TfidfTransformer
+        self.idf = (np.log((1 + total) / (1 + document_frequency)) + 1).astype(np.float32)
+        return total
+
+    def fit(self, chunks):
+        """Fits on the (question, answer) chunks yielded by each call to chunks()."""
+        total = self.fit_idf(chunks)
+
+        # k-means needs at least k rows in its first batch
+        self.n_clusters = max(1, min(self.n_clusters, total, CHUNK_SIZE))
+        self._set_centers(self._fit_kmeans(chunks, self.n_clusters))
+        self._balance(chunks, total)
+        return self
+
+    def _fit_kmeans(self, chunks, n_clusters, select=None, epochs=CLUSTER_EPOCHS):
+        """Fits MiniBatchKMeans over `epochs` streamed passes; returns the cluster centers.
+
+        Without select, one model with n_clusters clusters is fitted on all
+        rows. Otherwise n_clusters maps group -> k, select(vectors) yields
+        (group, vectors) for the rows of a chunk each group's model is
+        fitted on, and the result maps group -> centers.
+        """
+        groups = n_clusters if select is not None else {None: n_clusters}
+        models = {group: MiniBatchKMeans(n_clusters=k, random_state=CLUSTER_SEED, n_init=1)
+                  for group, k in groups.items()}
+        # Mini-batches are cut across chunk boundaries, so filtered-out rows
+        # never leave the first batch smaller than k.
+        pending = dict.fromkeys(groups)
+        for _ in range(epochs):
+            for chunk in chunks():
+                vectors = self._tfidf(chunk["question"])
+                for group, rows in select(vectors) if select is not None else [(None, vectors)]:
+                    batch_size = max(CLUSTER_BATCH_SIZE, groups[group])
+                    if pending[group] is not None:
+                        rows = sp.vstack([pending[group], rows], format="csr")
+                    while rows.shape[0] >= batch_size:
+                        models[group].partial_fit(rows[:batch_size])
+                        rows = rows[batch_size:]
+                    pending[group] = rows
+        for group, rows in pending.items():
+            if rows is not None and rows.shape[0] > 0:
+                models[group].partial_fit(rows)
+        centers = {group: model.cluster_centers_ for group, model in models.items()}
+        return centers if select is not None else centers[None]
+
+    def _set_centers(self, centers):
+        # Sparse: centers only have weight on terms their rows use
+        self.centers = sp.csr_matrix(centers)
+        self._center_norms = np.asarray(self.centers.multiply(self.centers).sum(axis=1)).ravel()
+        self.n_clusters = self.centers.shape[0]
+
+    def _distances(self, vectors):
+        # Squared distances, less each row's own norm (the same for every center)
+        return self._center_norms - 2 * (vectors @ self.centers.T).toarray()
+
+    def _nearest(self, vectors):
+        return self._distances(vectors).argmin(axis=1)
+
+    def _count_sizes(self, chunks):
+        sizes = np.zeros(self.n_clusters, dtype=np.int64)
+        for chunk in chunks():
+            sizes += np.bincount(self.predict(chunk["question"]), minlength=self.n_clusters)
+        return sizes
+
+    def _balance(self, chunks, total):
+        """Splits oversized clusters and dissolves tiny ones, keeping at most n_clusters."""
+        target = self.n_clusters
+        average = total / target
+        max_size = max(CLUSTER_MIN_SIZE, int(CLUSTER_MAX_SIZE_FACTOR * average))
+        sizes = self._count_sizes(chunks)
+        for _ in range(CLUSTER_BALANCE_ROUNDS):
+            oversized = np.flatnonzero(sizes > max_size).tolist()
+            if oversized:
+                def rows_of(vectors):
+                    labels = self._nearest(vectors)
+                    for cluster in oversized:
+                        selected = labels == cluster
+                        if selected.any():
+                            yield cluster, vectors[selected]
+
+                # Each is split into clusters of about the average size; one
+                # pass splits about as well as CLUSTER_EPOCHS and costs less
+                parts = self._fit_kmeans(chunks, {c: int(np.ceil(sizes[c] / average)) for c in oversized},
+                                         rows_of, epochs=1)
+                kept = self.centers[np.setdiff1d(np.arange(self.n_clusters), oversized)]
+                self._set_centers(sp.vstack([kept] + [sp.csr_matrix(parts.pop(c)) for c in oversized]))
+                self.split += len(oversized)
+                sizes = self._count_sizes(chunks)
+
+            # Tiny clusters go, then the smallest ones until at most target are left
+            keep = sizes >= min(CLUSTER_MIN_SIZE, sizes.max())
+            if keep.sum() > target:
+                keep[np.argsort(-sizes, kind="stable")[target:]] = False
+            if keep.all():
+                if not oversized:
+                    break
+                continue
+            self._set_centers(self.centers[np.flatnonzero(keep)])
+            self.dissolved += int((~keep).sum())
+            sizes = self._count_sizes(chunks)
+        # Enough room for every row, however many clusters are left
+        self.max_size = max(max_size, -(-total // self.n_clusters))
+
+    def predict(self, questions):
+        """Nearest cluster of each question, without the size cap."""
+        return self._nearest(self._tfidf(questions))
+
+    def labels(self, chunks):
+        """Yields the cluster of every row chunks() yields, in order, capped at max_size rows each.
+
+        A row whose nearest cluster is full goes to the nearest one with
+        room left, so which rows move depends on CSV order.
+        """
+        sizes = np.zeros(self.n_clusters, dtype=np.int64)
+        for chunk in chunks():
+            distances = self._distances(self._tfidf(chunk["question"]))
+            labels = distances.argmin(axis=1)
+            if (sizes + np.bincount(labels, minlength=self.n_clusters) > self.max_size).any():
+                for i in range(len(labels)):
+                    if sizes[labels[i]] >= self.max_size:
+                        labels[i] = np.where(sizes < self.max_size, distances[i], np.inf).argmin()
+                    sizes[labels[i]] += 1
+            else:
+                sizes += np.bincount(labels, minlength=self.n_clusters)
+            yield from labels.tolist()
+
+    def assign_nearest(self, new_questions, known, chunks, block_size=1000):
+        """Cluster of the most similar already-clustered row, for each new row.
+
+        new_questions maps row key -> question for the new rows; known maps
+        row key -> (pair name, cluster) for the existing ones. Needs fit_idf
+        first. Clusters are capped like fit()'s, at CLUSTER_MAX_SIZE_FACTOR
+        times the average size: a new row whose best cluster is full joins
+        the best one with room left. Sets max_size.
+        """
+        keys = list(new_questions)
+        best = {}  # cluster -> best score of each new row against its rows
+        sizes = Counter()
+        seen = Counter()
+        for chunk in chunks():
+            chunk_keys = row_keys(chunk, seen)
+            existing = [j for j, key in enumerate(chunk_keys) if key in known]
+            if not existing:
+                continue
+            known_clusters = np.array([known[chunk_keys[j]][1] for j in existing])
+            members = {cluster: known_clusters == cluster for cluster in np.unique(known_clusters).tolist()}
+            for cluster, selected in members.items():
+                sizes[cluster] += int(selected.sum())
+                best.setdefault(cluster, np.full(len(keys), -1.0))
+            vectors = self._tfidf(chunk["question"].iloc[existing])
+            for start in range(0, len(keys), block_size):
+                block = slice(start, start + block_size)
+                new_vectors = self._tfidf([new_questions[key] for key in keys[block]])
+                scores = (new_vectors @ vectors.T).toarray()
+                for cluster, selected in members.items():
+                    np.maximum(best[cluster][block], scores[:, selected].max(axis=1), out=best[cluster][block])
+        if not best:
+            return {}
+
+        clusters = np.array(sorted(best))
+        scores = np.column_stack([best[cluster] for cluster in clusters.tolist()])
+        total = sum(sizes.values()) + len(keys)
+        self.max_size = max(CLUSTER_MIN_SIZE, int(CLUSTER_MAX_SIZE_FACTOR * total / len(clusters)),
+                            -(-total // len(clusters)))
+        room = self.max_size - np.array([sizes[cluster] for cluster in clusters.tolist()])
+        labels = scores.argmax(axis=1)
+        for i in range(len(labels)):
+            if room[labels[i]] <= 0:
+                labels[i] = np.where(room > 0, scores[i], -np.inf).argmax()
+            room[labels[i]] -= 1
+        return dict(zip(keys, clusters[labels].tolist()))
+
+
+def dump_yaml(data):
+    return yaml.dump(data, Dumper=YAML_DUMPER, sort_keys=False, allow_unicode=True, default_flow_style=False)
+
+
+def dump_section(key, items):
+    """YAML for items nested under key, without the key line itself."""
+    return dump_yaml({key: items}).split("\n", 1)[1]
+
+
+class YamlEmitter:
+    """Turns section chunks into YAML text, in this process or on worker processes.
+
+    Text is written in submission order, so every file is byte-for-byte the
+    same as in a serial run. With workers, only a few chunks per worker are
+    in flight at once, which keeps memory bounded.
+    """
+
+    def __init__(self, workers=EMIT_WORKERS):
+        self.pool = None
+        if workers > 0:
+            # spawn: forking after scikit-learn/OpenMP threads have started can deadlock
+            self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.max_pending = max(1, workers) * EMIT_MAX_PENDING_PER_WORKER
+        self._pending = deque()
+
+    def emit(self, writer, items):
+        if self.pool is None:
+            writer.write_text(dump_section(writer.key, items))
             return
-        
-        df = df.rename(columns={df.columns[0]: 'question', df.columns[1]: 'answer'})
-        print(f"Loaded {len(df)} rows from CSV")
-    except FileNotFoundError:
+        self._pending.append((writer, self.pool.submit(dump_section, writer.key, items)))
+        while len(self._pending) > self.max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        writer, future = self._pending.popleft()
+        writer.write_text(future.result())
+
+    def flush(self):
+        while self._pending:
+            self._write_next()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class YamlSectionWriter:
+    """Streams one top-level YAML key whose value is a list or mapping, a chunk at a time.
+
+    Each chunk is dumped nested under the key and the key line is dropped,
+    so the file is byte-for-byte what a single yaml.dump of the whole
+    section would produce.
+    """
+
+    def __init__(self, f, key, empty, emitter):
+        self.f = f
+        self.key = key
+        self.empty = empty
+        self.emitter = emitter
+        self.started = False
+
+    def write(self, items):
+        if items:
+            self.emitter.emit(self, items)
+
+    def write_text(self, text):
+        if not self.started:
+            self.f.write(f"{self.key}:\n")
+            self.started = True
+        self.f.write(text)
+
+    def close(self):
+        self.emitter.flush()
+        if not self.started:
+            self.f.write(f"{self.key}: {self.empty}\n")
+
+
+def cluster_sizes(rows):
+    """Distribution of rows over the clusters of a ManifestRows, for the log."""
+    sizes = np.sort(list(Counter(cluster for _, _, cluster in rows).values()))
+    return f"{len(sizes)} clusters of {sizes[0]} to {sizes[-1]} rows (median {int(np.median(sizes))})"
+
+
+def assign_names():
+    """Names and clusters for every CSV row, reusing the previous generation's where possible.
+
+    Returns (manifest, new_row_count, chunks). The manifest's rows are a
+    ManifestRows, in the order chunks() yields the rows. Rows seen before
+    keep their qa_pair name and, unless re-clustering is needed, their
+    cluster; new rows get fresh names. chunks() re-reads the deduplicated
+    rows.
+    """
+    previous = load_manifest()
+    known = previous["rows"] if previous else {}
+    next_pair = previous["next_pair"] if previous else 0
+    clustered = INTENT_CLUSTERS > 0
+    # New rows' questions are only kept when they may join existing clusters
+    incremental = clustered and previous is not None and previous.get("intent_clusters") == INTENT_CLUSTERS
+
+    rows = ManifestRows()
+    new_rows = 0
+    new_questions = {}
+    seen = Counter()
+    kept = []
+    deduplicator = Deduplicator() if DEDUPLICATE_QUESTIONS else None
+    for chunk in read_qa_chunks(deduplicator):
+        kept.append(chunk.index.to_numpy())
+        for key, i, question in zip(row_keys(chunk, seen), chunk.index, chunk["question"]):
+            if key in known:
+                name, cluster = known[key]
+            else:
+                if previous is None:
+                    # First generation: name rows after their CSV row number
+                    name = f"qa_pair_{i}"
+                    next_pair = max(next_pair, i + 1)
+                else:
+                    name = f"qa_pair_{next_pair}"
+                    next_pair += 1
+                cluster = None
+                new_rows += 1
+                if incremental:
+                    new_questions[key] = question
+            rows.append(key, name, cluster if clustered else None)
+    chunks = read_qa_chunks
+    if deduplicator is not None:
+        print(f"Deduplicated questions: {format_report(deduplicator.report())}")
+        keep_rows = np.concatenate(kept) if kept else np.zeros(0, dtype=np.int64)
+        chunks = lambda: read_qa_chunks(keep_rows=keep_rows)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "csv_file": CSV_FILE,
+        "intent_clusters": INTENT_CLUSTERS,
+        "next_pair": next_pair,
+    }
+    if not clustered or not len(rows):
+        manifest["rows"] = rows
+        return manifest, new_rows, chunks
+
+    clusterer = IntentClusterer(INTENT_CLUSTERS)
+    if not incremental or new_rows > RECLUSTER_THRESHOLD * len(rows):
+        print(f"Clustering questions into up to {INTENT_CLUSTERS} intents...")
+        clusterer.fit(chunks)
+        labels = clusterer.labels(chunks)
+        rows = rows.relabel(lambda key, cluster: next(labels))
+        print(f"Cluster sizes: {cluster_sizes(rows)}, at most {clusterer.max_size}; "
+              f"{clusterer.split} split and {clusterer.dissolved} dissolved while rebalancing")
+    elif new_questions:
+        print(f"Adding {len(new_questions)} new questions to existing intents...")
+        clusterer.fit_idf(chunks)
+        assigned = clusterer.assign_nearest(new_questions, known, chunks)
+        rows = rows.relabel(lambda key, cluster: assigned.get(key, cluster))
+        print(f"Cluster sizes: {cluster_sizes(rows)}, at most {clusterer.max_size}")
+    manifest["rows"] = rows
+    return manifest, new_rows, chunks
+
+
+def write_single_files(manifest, chunks):
+    """Streams domain.yml, data/nlu.yml and data/rules.yml to .tmp files.
+
+    Returns (output paths, rows written, intents written).
+    """
+    domain_path = os.path.join(PROJECT_DIRECTORY, "domain.yml")
+    nlu_path = os.path.join(PROJECT_DIRECTORY, "data", "nlu.yml")
+    rules_path = os.path.join(PROJECT_DIRECTORY, "data", "rules.yml")
+    header = dump_yaml({"version": "3.1"})
+    rows = iter(manifest["rows"])
+    clustered = INTENT_CLUSTERS > 0
+    total_rows = 0
+    intent_count = 0
+    clusters_used = set()
+
+    # Responses come after every intent in domain.yml, so they are spooled
+    # to a temporary file and appended once all intents have been written.
+    with open(domain_path + ".tmp", "w", encoding="utf-8") as domain_file, \
+            open(nlu_path + ".tmp", "w", encoding="utf-8") as nlu_file, \
+            open(rules_path + ".tmp", "w", encoding="utf-8") as rules_file, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=PROJECT_DIRECTORY) as responses_spool, \
+            YamlEmitter(EMIT_WORKERS) as emitter:
+        for f in (domain_file, nlu_file, rules_file):
+            f.write(header)
+        intents = YamlSectionWriter(domain_file, "intents", "[]", emitter)
+        responses = YamlSectionWriter(responses_spool, "responses", "{}", emitter)
+        nlu = YamlSectionWriter(nlu_file, "nlu", "[]", emitter)
+        rules = YamlSectionWriter(rules_file, "rules", "[]", emitter)
+
+        for chunk in chunks():
+            total_rows += len(chunk)
+            entries = [entry[1:] for entry in islice(rows, len(chunk))]
+            if not clustered:
+                intent_names = [name for name, _ in entries]
+            else:
+                # Retrieval intents: kb_cluster_N/qa_pair_i, answered by utter_kb_cluster_N
+                clusters_used.update(cluster for _, cluster in entries)
+                intent_names = [f"kb_cluster_{cluster}/{name}" for name, cluster in entries]
+            response_names = ["utter_" + name for name in intent_names]
+
+            nlu.write([
+                {"intent": name, "examples": f"- {question}"}
+                for name, question in zip(intent_names, chunk["question"])
+            ])
+            responses.write({
+                name: [{"text": answer}]
+                for name, answer in zip(response_names, chunk["answer"])
+            })
+            if not clustered:
+                intents.write(intent_names)
+                rules.write(make_rules(intent_names))
+                intent_count += len(intent_names)
+
+        if clustered:
+            cluster_names = [f"kb_cluster_{c}" for c in sorted(clusters_used)]
+            intents.write(cluster_names)
+            rules.write(make_rules(cluster_names))
+            intent_count = len(cluster_names)
+
+        intents.close()
+        responses.close()
+        nlu.close()
+        rules.close()
+
+        responses_spool.seek(0)
+        shutil.copyfileobj(responses_spool, domain_file)
+        domain_file.write(dump_yaml({"session_config": SESSION_CONFIG}))
+
+    print(f"Domain file has {intent_count} intents and {total_rows} responses")
+    print(f"NLU file has {total_rows} examples")
+    print(f"Rules file has {intent_count} rules")
+    return [domain_path, nlu_path, rules_path], total_rows, intent_count
+
+
+def make_rules(intent_names):
+    """One rule per intent, answering it with utter_<intent>."""
+    return [
+        {"rule": f"Respond to {name}", "steps": [{"intent": name}, {"action": f"utter_{name}"}]}
+        for name in intent_names
+    ]
+
+
+def shard_name(name, cluster, cluster_rows):
+    """The shard a row belongs to. cluster_rows counts rows per cluster so far, in CSV order.
+
+    Clustered rows are grouped by cluster, split into parts of at most
+    SHARD_MAX_ROWS rows. Otherwise rows are grouped by qa_pair number
+    range, which stays put when other rows are added or removed.
+    """
+    if cluster is None:
+        start = int(name.rsplit("_", 1)[1]) // SHARD_MAX_ROWS * SHARD_MAX_ROWS
+        return f"qa_pairs_{start}-{start + SHARD_MAX_ROWS - 1}"
+    part = cluster_rows[cluster] // SHARD_MAX_ROWS
+    cluster_rows[cluster] += 1
+    return f"kb_cluster_{cluster}" + (f"_part{part + 1}" if part else "")
+
+
+class AppendFile:
+    """File-like object that reopens its file for each write.
+
+    Keeps the number of open files at one however many shards there are.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, text):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+def write_sharded_files(manifest, chunks):
+    """Streams one domain, NLU and rules file per intent group to .tmp files.
+
+    Layout: domain/domain.yml (session config) plus domain/<group>.yml
+    (intents and responses), data/nlu/<group>.yml and data/rules/<group>.yml.
+    Returns (output paths, rows written, intents written).
+    """
+    domain_dir = os.path.join(PROJECT_DIRECTORY, "domain")
+    nlu_dir = os.path.join(PROJECT_DIRECTORY, "data", "nlu")
+    rules_dir = os.path.join(PROJECT_DIRECTORY, "data", "rules")
+    for directory in (domain_dir, nlu_dir, rules_dir):
+        os.makedirs(directory, exist_ok=True)
+    header = dump_yaml({"version": "3.1"})
+
+    # The intents (and so the rules) of every shard are known from the
+    # manifest up front; only examples and responses need streaming.
+    shard_intents = {}
+    cluster_rows = Counter()
+    for _, name, cluster in manifest["rows"]:
+        intents = shard_intents.setdefault(shard_name(name, cluster, cluster_rows), [])
+        if cluster is None:
+            intents.append(name)
+        elif cluster_rows[cluster] == 1:
+            intents.append(f"kb_cluster_{cluster}")
+
+    base_path = os.path.join(domain_dir, "domain.yml")
+    with open(base_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(header + dump_yaml({"session_config": SESSION_CONFIG}))
+    outputs = [base_path]
+    for shard, intents in shard_intents.items():
+        if intents:
+            rules_path = os.path.join(rules_dir, shard + ".yml")
+            with open(rules_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(header + dump_yaml({"rules": make_rules(intents)}))
+            outputs.append(rules_path)
+
+    writers = {}
+    total_rows = 0
+    with YamlEmitter(EMIT_WORKERS) as emitter:
+        def open_shard(shard):
+            domain_path = os.path.join(domain_dir, shard + ".yml")
+            nlu_path = os.path.join(nlu_dir, shard + ".yml")
+            with open(domain_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(header)
+                if shard_intents[shard]:
+                    f.write(dump_yaml({"intents": shard_intents[shard]}))
+            with open(nlu_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(header)
+            outputs.extend([domain_path, nlu_path])
+            return (YamlSectionWriter(AppendFile(nlu_path + ".tmp"), "nlu", "[]", emitter),
+                    YamlSectionWriter(AppendFile(domain_path + ".tmp"), "responses", "{}", emitter))
+
+        rows = iter(manifest["rows"])
+        cluster_rows = Counter()
+        for chunk in chunks():
+            total_rows += len(chunk)
+            groups = {}
+            entries = [entry[1:] for entry in islice(rows, len(chunk))]
+            for (name, cluster), question, answer in zip(entries, chunk["question"], chunk["answer"]):
+                intent = name if cluster is None else f"kb_cluster_{cluster}/{name}"
+                examples, responses = groups.setdefault(shard_name(name, cluster, cluster_rows), ([], {}))
+                examples.append({"intent": intent, "examples": f"- {question}"})
+                responses[f"utter_{intent}"] = [{"text": answer}]
+            for shard, (examples, responses) in groups.items():
+                if shard not in writers:
+                    writers[shard] = open_shard(shard)
+                nlu, domain_responses = writers[shard]
+                nlu.write(examples)
+                domain_responses.write(responses)
+
+        for nlu, domain_responses in writers.values():
+            nlu.close()
+            domain_responses.close()
+
+    intent_count = sum(len(intents) for intents in shard_intents.values())
+    print(f"Wrote {len(writers)} shards of at most {SHARD_MAX_ROWS} rows under domain/, data/nlu/ and data/rules/")
+    print(f"Domain has {intent_count} intents and {total_rows} responses")
+    return outputs, total_rows, intent_count
+
+
+def generated_files():
+    """Every generated data file currently in the project, in either layout."""
+    paths = [os.path.join(PROJECT_DIRECTORY, "domain.yml"),
+             os.path.join(PROJECT_DIRECTORY, "data", "nlu.yml"),
+             os.path.join(PROJECT_DIRECTORY, "data", "rules.yml")]
+    for directory in (os.path.join(PROJECT_DIRECTORY, "domain"),
+                      os.path.join(PROJECT_DIRECTORY, "data", "nlu"),
+                      os.path.join(PROJECT_DIRECTORY, "data", "rules")):
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                         if name.endswith(".yml"))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def generate_rasa_data_files():
+    """Reads the CSV in chunks and streams the nlu, domain, and rules files.
+
+    Only files whose content changed are replaced, and generated files that
+    are no longer produced (e.g. after switching layouts) are removed.
+    """
+    if not os.path.exists(CSV_FILE):
         print(f"Error: Make sure '{CSV_FILE}' is in the same directory as this script.")
         return
+
+    # Written to temporary files and renamed into place only once complete,
+    # so a bad row halfway through never leaves a truncated project behind.
+    try:
+        manifest, new_rows, chunks = assign_names()
+        print(f"Loaded {len(manifest['rows'])} usable rows from CSV ({new_rows} new since the last generation)")
+        if SHARD_MAX_ROWS > 0:
+            outputs, total_rows, intent_count = write_sharded_files(manifest, chunks)
+        else:
+            outputs, total_rows, intent_count = write_single_files(manifest, chunks)
+        changed = [path for path in outputs if replace_if_changed(path + ".tmp", path)]
+        removed = [path for path in generated_files() if path not in outputs]
+        for path in removed:
+            os.remove(path)
+        for directory in (os.path.join(PROJECT_DIRECTORY, "domain"),
+                          os.path.join(PROJECT_DIRECTORY, "data", "nlu"),
+                          os.path.join(PROJECT_DIRECTORY, "data", "rules")):
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+        write_manifest(manifest)
+        manifest["rows"].close()
     except Exception as e:
         print(f"Error reading CSV: {e}")
+        for root, _, files in os.walk(PROJECT_DIRECTORY):
+            for name in files:
+                if name.endswith((".yml.tmp", ".jsonl.tmp")):
+                    os.remove(os.path.join(root, name))
         return
 
-    # Initialize data structures
-    intents = []
-    responses = {}
-    rules = []
-    nlu_examples = []
-
-    # Process each row
-    for i, row in df.iterrows():
-        intent_name = f"qa_pair_{i}"
-        response_name = f"utter_{intent_name}"
-        
-        question = str(row['question']).strip()
-        answer = str(row['answer']).strip()
-
-        # Skip empty rows
-        if not question or not answer or question == 'nan' or answer == 'nan':
-            continue
-
-        # Add to intents list
-        intents.append(intent_name)
-        
-        # Add NLU example
-        nlu_examples.append({
-            "intent": intent_name,
-            "examples": f"- {question}"
-        })
-        
-        # Add response
-        responses[response_name] = [{"text": answer}]
-        
-        # Add rule
-        rules.append({
-            "rule": f"Respond to {intent_name}",
-            "steps": [
-                {"intent": intent_name}, 
-                {"action": response_name}
-            ]
-        })
-
-    print(f"Generated {len(intents)} intents from CSV data")
-
-    # Create domain.yml
-    domain_content = {
-        "version": "3.1",
-        "intents": intents,
-        "responses": responses,
-        "session_config": {
-            "session_expiration_time": 60,
-            "carry_over_slots_to_new_session": True
-        }
-    }
-    
-    domain_path = os.path.join(PROJECT_DIRECTORY, "domain.yml")
-    with open(domain_path, "w", encoding="utf-8") as f:
-        yaml.dump(domain_content, f, sort_keys=False, allow_unicode=True, default_flow_style=False)
-    
-    print(f"Domain file created with {len(intents)} intents and {len(responses)} responses")
-
-    # Create nlu.yml
-    nlu_content = {
-        "version": "3.1",
-        "nlu": nlu_examples
-    }
-    
-    nlu_path = os.path.join(PROJECT_DIRECTORY, "data", "nlu.yml")
-    with open(nlu_path, "w", encoding="utf-8") as f:
-        yaml.dump(nlu_content, f, sort_keys=False, allow_unicode=True, default_flow_style=False)
-    
-    print(f"NLU file created with {len(nlu_examples)} examples")
-
-    # Create rules.yml
-    rules_content = {
-        "version": "3.1",
-        "rules": rules
-    }
-    
-    rules_path = os.path.join(PROJECT_DIRECTORY, "data", "rules.yml")
-    with open(rules_path, "w", encoding="utf-8") as f:
-        yaml.dump(rules_content, f, sort_keys=False, allow_unicode=True, default_flow_style=False)
-    
-    print(f"Rules file created with {len(rules)} rules")
+    print(f"Generated {intent_count} intents from CSV data")
+    unchanged = len(outputs) - len(changed)
+    if len(outputs) <= 3:
+        if changed:
+            print("Updated: " + ", ".join(changed))
+        if unchanged:
+            print("Unchanged: " + ", ".join(path for path in outputs if path not in changed))
+    else:
+        print(f"Updated {len(changed)} files, {unchanged} unchanged")
+    if removed:
+        print(f"Removed {len(removed)} files no longer generated")
 
 
 def remove_readonly(func, path, _):
@@ -278,19 +1018,29 @@ def safe_remove_directory(directory):
 
 
 def validate_yaml_files():
-    """Validates that all YAML files are properly formatted."""
-    yaml_files = [
-        os.path.join(PROJECT_DIRECTORY, "domain.yml"),
-        os.path.join(PROJECT_DIRECTORY, "config.yml"),
-        os.path.join(PROJECT_DIRECTORY, "data", "nlu.yml"),
-        os.path.join(PROJECT_DIRECTORY, "data", "rules.yml")
-    ]
+    """Validates that all YAML files are properly formatted.
+
+    Files are checked with a streamed parse: the parser's events are
+    consumed without building Python objects, so even a huge domain.yml is
+    validated in bounded memory and without a full second load.
+    """
+    if SHARD_MAX_ROWS > 0:
+        yaml_files = [os.path.join(PROJECT_DIRECTORY, "domain", "domain.yml")]
+    else:
+        yaml_files = [
+            os.path.join(PROJECT_DIRECTORY, "domain.yml"),
+            os.path.join(PROJECT_DIRECTORY, "data", "nlu.yml"),
+            os.path.join(PROJECT_DIRECTORY, "data", "rules.yml")
+        ]
+    yaml_files.append(os.path.join(PROJECT_DIRECTORY, "config.yml"))
+    yaml_files += [path for path in generated_files() if path not in yaml_files]
     
     for yaml_file in yaml_files:
         if os.path.exists(yaml_file):
             try:
                 with open(yaml_file, "r", encoding="utf-8") as f:
-                    yaml.safe_load(f)
+                    for _ in yaml.parse(f, Loader=YAML_LOADER):
+                        pass
                 print(f"✅ {yaml_file} is valid")
             except yaml.YAMLError as e:
                 print(f"❌ {yaml_file} has YAML syntax error: {e}")
@@ -304,10 +1054,29 @@ def validate_yaml_files():
 
 # --- Main Execution ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a Rasa project from a Q&A CSV.")
+    parser.add_argument("--intents", type=int, default=INTENT_CLUSTERS,
+                        help=f"target number of clustered intents; 0 for one intent per row (default: {INTENT_CLUSTERS})")
+    parser.add_argument("--clean", action="store_true",
+                        help="delete the project directory and regenerate everything from scratch")
+    parser.add_argument("--deduplicate", action="store_true",
+                        help="drop rows whose question duplicates an earlier one")
+    parser.add_argument("--workers", type=int, default=EMIT_WORKERS,
+                        help="processes emitting YAML in parallel, for large CSVs (default: 0, no extra processes)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_MAX_ROWS,
+                        help="split domain and data files by intent group, at most this many rows each "
+                             "(default: 0, single files)")
+    args = parser.parse_args()
+    SHARD_MAX_ROWS = args.shard_size
+    EMIT_WORKERS = args.workers
+    INTENT_CLUSTERS = args.intents
+    DEDUPLICATE_QUESTIONS = args.deduplicate
+
     print("Starting Rasa project generation...")
     
-    # Clean up old project directory with Windows permission handling
-    if not safe_remove_directory(PROJECT_DIRECTORY):
+    # Files are regenerated in place and only rewritten when their content
+    # changes; --clean starts over (with Windows permission handling)
+    if args.clean and not safe_remove_directory(PROJECT_DIRECTORY):
         print("\n❌ Could not remove old project directory.")
         print("Please manually delete the 'rasa_chatbot' folder and try again.")
         print("Or close any applications that might be using files in that folder.")
@@ -324,6 +1093,6 @@ if __name__ == "__main__":
         print("\n✅ Rasa project generation complete! All YAML files are valid.")
         print(f"\nTo train your model, run:")
         print(f"cd {PROJECT_DIRECTORY}")
-        print(f"rasa train")
+        print("rasa train --domain domain" if SHARD_MAX_ROWS > 0 else "rasa train")
     else:
         print("\n❌ Some YAML files have errors. Please check the output above.")
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""Fast-start wrapper around the `rasa` command for the server container.
+
+A plain `rasa run -m models` unpacks the model tarball into a temporary
+directory on every start before building the graph. This wrapper keeps an
+unpacked copy of the model, made when the image is built, and loads from it
+whenever the archive being served is the same one. It also reports how long
+startup took.
+
+Usage:
+    # At image build time: unpack the latest model and check it loads
+    # (fails without a usable model unless --allow-missing is given)
+    python fast_start.py warm-cache [--allow-missing]
+
+    # At container start: any rasa command line, e.g.
+    python fast_start.py run -m models --enable-api
+
+Startup timings (imports, model load, time until the HTTP port answers) are
+printed and written as JSON to STARTUP_METRICS_FILE.
+"""
+import time
+
+PROCESS_START = time.perf_counter()
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import urllib.request
+from pathlib import Path
+
+# --- CONFIGURATION ---
+MODEL_DIRECTORY = os.environ.get("RASA_MODEL_DIRECTORY", "models")
+MODEL_CACHE_DIRECTORY = os.environ.get("RASA_MODEL_CACHE", ".model_cache")
+STARTUP_METRICS_FILE = os.environ.get("RASA_STARTUP_METRICS_FILE", "startup_metrics.json")
+# Port polled to tell when the server is ready; matches `rasa run --port`
+SERVER_PORT = 5005
+READY_TIMEOUT = 600
+WARM_UP_MESSAGE = "hello"
+
+CACHE_INDEX_FILE = "index.json"
+METADATA_FILE = "metadata.json"
+STORAGE_DIRECTORY = "storage"
+
+startup = {"cache_hit": False}
+
+
+def archive_digest(archive_path):
+    """sha256 of a model archive, remembered in the cache index by size and mtime
+    so an unchanged archive is not re-hashed on every start."""
+    stat = os.stat(archive_path)
+    key = f"{os.path.basename(archive_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    index_path = os.path.join(MODEL_CACHE_DIRECTORY, CACHE_INDEX_FILE)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if key in index:
+        return index[key]
+
+    sha = hashlib.sha256()
+    with open(archive_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    try:
+        index[key] = digest
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+    except OSError:
+        pass  # read-only cache; hashing again next time is only slower
+    return digest
+
+
+def unpack_model(archive_path):
+    """Unpacks an archive into the cache with Rasa's own model storage; returns its cache directory."""
+    from rasa.engine.storage.local_model_storage import LocalModelStorage
+
+    os.makedirs(MODEL_CACHE_DIRECTORY, exist_ok=True)
+    cache_dir = os.path.join(MODEL_CACHE_DIRECTORY, archive_digest(archive_path))
+    if os.path.exists(os.path.join(cache_dir, METADATA_FILE)):
+        return cache_dir
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    storage_dir = os.path.join(cache_dir, STORAGE_DIRECTORY)
+    os.makedirs(storage_dir)
+    _, metadata = LocalModelStorage.from_model_archive(
+        storage_path=Path(storage_dir), model_archive_path=Path(archive_path)
+    )
+    # Written last: its presence marks a complete entry
+    with open(os.path.join(cache_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata.as_dict(), f)
+    return cache_dir
+
+
+def install_model_cache():
+    """Makes Rasa load models from the cache when their archive has been unpacked there.
+
+    Everything else (archives that are not cached, e.g. a model trained after
+    the image was built) goes through the normal unpack.
+    """
+    from rasa.engine.storage.local_model_storage import LocalModelStorage
+    from rasa.engine.storage.storage import ModelMetadata
+
+    unpack = LocalModelStorage.from_model_archive.__func__
+
+    def from_model_archive(cls, storage_path, model_archive_path):
+        start = time.perf_counter()
+        cache_dir = None
+        if os.path.isdir(MODEL_CACHE_DIRECTORY):
+            cache_dir = os.path.join(MODEL_CACHE_DIRECTORY, archive_digest(str(model_archive_path)))
+        metadata_path = cache_dir and os.path.join(cache_dir, METADATA_FILE)
+        if metadata_path and os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = ModelMetadata.from_dict(json.load(f))
+            result = cls(Path(cache_dir, STORAGE_DIRECTORY)), metadata
+            startup["cache_hit"] = True
+        else:
+            result = unpack(cls, storage_path, model_archive_path)
+        startup["model_unpack_s"] = round(time.perf_counter() - start, 3)
+        return result
+
+    LocalModelStorage.from_model_archive = classmethod(from_model_archive)
+
+    # Time the whole model load (unpack plus building the graph)
+    from rasa.core.agent import Agent
+
+    load_model = Agent.load_model
+
+    def timed_load_model(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return load_model(self, *args, **kwargs)
+        finally:
+            startup["model_load_s"] = round(time.perf_counter() - start, 3)
+
+    Agent.load_model = timed_load_model
+
+
+def report_startup():
+    startup["process_start_to_ready_s"] = round(time.perf_counter() - PROCESS_START, 3)
+    print("Startup: " + ", ".join(f"{key}={value}" for key, value in sorted(startup.items())), flush=True)
+    try:
+        with open(STARTUP_METRICS_FILE, "w", encoding="utf-8") as f:
+            json.dump(startup, f, indent=2, sort_keys=True)
+    except OSError as e:
+        print(f"Warning: could not write {STARTUP_METRICS_FILE}: {e}")
+
+
+def wait_until_ready(port):
+    """Reports startup once the server answers GET / (from a daemon thread)."""
+    deadline = time.perf_counter() + READY_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                report_startup()
+                return
+        except OSError:
+            time.sleep(0.05)
+
+
+def server_port(args):
+    for flag in ("--port", "-p"):
+        if flag in args[:-1]:
+            return int(args[args.index(flag) + 1])
+    return SERVER_PORT
+
+
+def warm_cache(allow_missing=False):
+    """Build-time step: unpack the latest model into the cache and check that it loads and answers.
+
+    Returns non-zero, failing the image build, when there is no model, it
+    cannot be unpacked, or it does not load. allow_missing lets the build
+    go ahead without a usable model (e.g. the placeholder in models/); a
+    model that unpacks but does not load still fails.
+    """
+    from rasa.core.agent import Agent
+    from rasa.model import get_latest_model
+
+    skip = "Warning" if allow_missing else "Error"
+    archive = get_latest_model(MODEL_DIRECTORY)
+    if not archive:
+        print(f"{skip}: no trained model in '{MODEL_DIRECTORY}'")
+        return 0 if allow_missing else 1
+
+    start = time.perf_counter()
+    try:
+        cache_dir = unpack_model(str(archive))
+    except Exception as e:
+        print(f"{skip}: could not unpack {archive}: {e}")
+        return 0 if allow_missing else 1
+    print(f"Unpacked {archive} to {cache_dir} in {time.perf_counter() - start:.2f}s")
+
+    install_model_cache()
+    start = time.perf_counter()
+    agent = Agent.load(str(archive))
+    asyncio.run(agent.parse_message(WARM_UP_MESSAGE))
+    print(f"Loaded the cached model and parsed a warm-up message in {time.perf_counter() - start:.2f}s "
+          f"(cache hit: {startup['cache_hit']})")
+    return 0 if startup["cache_hit"] else 1
+
+
+def main(argv):
+    if argv[:1] == ["warm-cache"]:
+        return warm_cache(allow_missing="--allow-missing" in argv[1:])
+    if argv[:1] == ["rasa"]:
+        argv = argv[1:]  # tolerate `command: rasa run ...` in compose files
+
+    from rasa.__main__ import main as rasa_main
+
+    startup["import_s"] = round(time.perf_counter() - PROCESS_START, 3)
+    install_model_cache()
+    if argv[:1] == ["run"]:
+        threading.Thread(target=wait_until_ready, args=(server_port(argv),),
+                         name="startup-metrics", daemon=True).start()
+    sys.argv = ["rasa"] + argv
+    return rasa_main()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
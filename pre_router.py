@@ -0,0 +1,201 @@
+"""Answers verbatim knowledge-base questions locally, before the Rasa webhook.
+
+Many messages are questions straight from Conversation.csv. Rasa would
+tokenize and classify them and run its policies, only to reply with that
+row's answer. The pre-router instead keeps a hashed index of the KB
+questions, normalized the same way the corpus deduplication does
+(lowercase, no punctuation), and replies with the answer directly. Only
+messages that miss are forwarded to Rasa.
+
+Only unambiguous, specific questions are indexed, so Rasa's own intents
+keep handling everything else:
+
+- greetings and goodbyes (see actions/small_talk.py)
+- questions that are also NLU training examples (e.g. "yes" and "no" for
+  affirm/deny)
+- questions shorter than PRE_ROUTER_MIN_WORDS words ("thanks", "why?",
+  "sure"), which are generic replies rather than KB lookups
+- questions that appear more than once with different answers
+
+Usage (hit rate over a message log, offline):
+    python pre_router.py --log messages.jsonl
+    python pre_router.py --csv Conversation.csv --rasa-latency-ms 250
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+
+import yaml
+
+from actions import small_talk
+from actions.corpus import normalize_question, read_pairs
+
+# --- CONFIGURATION ---
+PRE_ROUTER_ENABLED = os.environ.get("PRE_ROUTER_ENABLED", "true").lower() in ("true", "1", "yes")
+PRE_ROUTER_CSV = os.environ.get("PRE_ROUTER_CSV", "Conversation.csv")
+# NLU training data (file or directory); its examples are left to Rasa
+PRE_ROUTER_NLU = os.environ.get("PRE_ROUTER_NLU", "data")
+# Questions with fewer words than this are too generic to answer from the KB
+PRE_ROUTER_MIN_WORDS = int(os.environ.get("PRE_ROUTER_MIN_WORDS", "4"))
+
+# Bytes of the blake2b digest used as the index key
+DIGEST_SIZE = 8
+
+
+def question_key(text):
+    """Index key of a question or message; None if nothing is left after normalizing"""
+    normalized = normalize_question(text)
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+_ENTITY_ANNOTATION = re.compile(r"\[([^\]]*)\]\([^)]*\)|\[([^\]]*)\]\{[^}]*\}")
+
+
+def nlu_examples(path=PRE_ROUTER_NLU):
+    """Text of every NLU training example in a Rasa data file or directory, entity markup removed"""
+    if os.path.isdir(path):
+        files = [os.path.join(root, name) for root, _, names in os.walk(path)
+                 for name in names if name.endswith((".yml", ".yaml"))]
+    else:
+        files = [path] if os.path.exists(path) else []
+    examples = []
+    for data_file in files:
+        try:
+            with open(data_file, "r", encoding="utf-8") as f:
+                content = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Pre-router: could not read NLU examples from {data_file}: {e}")
+            continue
+        items = content.get("nlu") if isinstance(content, dict) else None
+        for item in items or []:
+            for line in str(item.get("examples") or "").splitlines():
+                line = line.strip()
+                if line.startswith("- "):
+                    examples.append(_ENTITY_ANNOTATION.sub(lambda m: m.group(1) or m.group(2), line[2:]))
+    return examples
+
+
+class PreRouter:
+    """Hashed normalized-question -> answer index, with hit/miss statistics.
+
+    Thread-safe: one instance is shared by every Streamlit session.
+    """
+
+    def __init__(self, pairs, exclude=small_talk.is_small_talk, reserved=(),
+                 min_words=PRE_ROUTER_MIN_WORDS):
+        """reserved: texts (e.g. NLU examples) that must always go to Rasa"""
+        reserved_keys = {question_key(text) for text in reserved}
+        answers = {}
+        conflicting = set()
+        self.skipped = 0
+        for question, answer in pairs:
+            key = question_key(question)
+            if (key is None or key in reserved_keys
+                    or len(normalize_question(question).split()) < min_words
+                    or (exclude is not None and exclude(question))):
+                self.skipped += 1
+                continue
+            if key in answers and answers[key] != answer:
+                conflicting.add(key)
+            answers.setdefault(key, answer)
+        for key in conflicting:
+            del answers[key]
+        self.conflicting = len(conflicting)
+        self._answers = answers
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.forwarded = 0
+        self.forward_seconds = 0.0
+
+    @classmethod
+    def from_csv(cls, csv_file=PRE_ROUTER_CSV):
+        """None (routing disabled) if the CSV cannot be read"""
+        try:
+            return cls(read_pairs(csv_file), reserved=nlu_examples())
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Pre-router disabled: could not read {csv_file}: {e}")
+            return None
+
+    def __len__(self):
+        return len(self._answers)
+
+    def route(self, message):
+        """The KB answer for the message, or None if it should go to Rasa"""
+        start = time.perf_counter()
+        answer = self._answers.get(question_key(message))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.lookup_seconds += elapsed
+        return answer
+
+    def record_forward(self, seconds):
+        """Time a missed message took to answer through Rasa; used to estimate savings"""
+        with self._lock:
+            self.forwarded += 1
+            self.forward_seconds += seconds
+
+    def stats(self, rasa_latency=None):
+        """Hit rate and estimated latency saved.
+
+        Savings assume each hit would have cost the mean Rasa round trip
+        (measured on forwarded misses, or rasa_latency in seconds if given).
+        """
+        with self._lock:
+            routed = self.hits + self.misses
+            if rasa_latency is None and self.forwarded:
+                rasa_latency = self.forward_seconds / self.forwarded
+            mean_lookup = self.lookup_seconds / routed if routed else 0.0
+            saved = self.hits * (rasa_latency - mean_lookup) if rasa_latency is not None else None
+            return {
+                "index_size": len(self._answers),
+                "messages": routed,
+                "hits": self.hits,
+                "hit_rate": self.hits / routed if routed else 0.0,
+                "mean_lookup_ms": mean_lookup * 1000,
+                "mean_rasa_ms": rasa_latency * 1000 if rasa_latency is not None else None,
+                "estimated_saved_s": saved,
+            }
+
+
+def format_stats(stats):
+    text = (f"{stats['hits']}/{stats['messages']} messages answered locally "
+            f"({stats['hit_rate']:.1%}), lookup {stats['mean_lookup_ms']:.3f} ms")
+    if stats["estimated_saved_s"] is not None:
+        text += (f"; about {stats['estimated_saved_s']:.2f} s saved "
+                 f"at {stats['mean_rasa_ms']:.0f} ms per Rasa round trip")
+    return text
+
+
+if __name__ == "__main__":
+    from benchmarks.load_test import load_csv_messages, load_log_messages
+
+    parser = argparse.ArgumentParser(description="Report the pre-router's hit rate over a set of messages.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="JSON-lines message log")
+    source.add_argument("--csv", help="CSV whose question column is used as messages")
+    parser.add_argument("--kb", default=PRE_ROUTER_CSV, help=f"knowledge-base CSV to index (default: {PRE_ROUTER_CSV})")
+    parser.add_argument("--rasa-latency-ms", type=float,
+                        help="mean Rasa round trip, for the estimated saving")
+    args = parser.parse_args()
+
+    router = PreRouter.from_csv(args.kb)
+    if router is None:
+        raise SystemExit(1)
+    messages = load_log_messages(args.log) if args.log else load_csv_messages(args.csv)
+    for _, message in messages:
+        router.route(message)
+    rasa_latency = args.rasa_latency_ms / 1000 if args.rasa_latency_ms is not None else None
+    print(f"Indexed {len(router)} questions from {args.kb} ({router.skipped} rows skipped as generic, "
+          f"small talk or NLU examples; {router.conflicting} questions dropped for conflicting answers)")
+    print(format_stats(router.stats(rasa_latency)))
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- CONFIGURATION ---
+
+# Separate connect and read timeouts (seconds): failing to connect should
+# be reported quickly, while a cold Hugging Face Space may take a while to
+# produce its first reply.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+WEBHOOK_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+HEALTH_CHECK_TIMEOUT = (CONNECT_TIMEOUT, 10)
+
+# Keep-alive connection pool shared by every request from this process.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+# Retry with exponential backoff when the Space's proxy answers 502/503,
+# which it does while the backend is waking up or restarting.
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (502, 503)
+
+# How often the background health monitor probes the server (seconds).
+HEALTH_CHECK_INTERVAL = 30
+
+
+def create_session():
+    """Create a requests session with a tuned keep-alive pool and retries."""
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=0,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    })
+    return session
+
+
+def stream_messages(session, webhook_url, message, sender):
+    """Yield bot messages from the REST webhook as the server sends them.
+
+    Uses the REST channel's stream mode (POST ...?stream=true), where the
+    server writes each bot message as one JSON line as soon as it is
+    produced. A server without stream support replies with the usual JSON
+    list, whose messages are yielded in turn.
+    """
+    payload = {
+        "sender": sender,
+        "message": message
+    }
+    with session.post(
+        webhook_url,
+        params={"stream": "true"},
+        json=payload,
+        timeout=WEBHOOK_TIMEOUT,
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if isinstance(data, list):
+                yield from data
+            else:
+                yield data
+
+
+def check_server(session, server_url):
+    """Check if Rasa server is running"""
+    try:
+        # First try the /status endpoint
+        response = session.get(f"{server_url}/status", timeout=HEALTH_CHECK_TIMEOUT)
+        if response.status_code == 200:
+            return True
+        
+        # If status endpoint fails, try the main endpoint
+        response = session.get(server_url, timeout=HEALTH_CHECK_TIMEOUT)
+        return response.status_code == 200
+        
+    except requests.exceptions.RequestException:
+        return False
+
+
+class HealthMonitor:
+    """Keeps the server's health status fresh from a background thread.
+
+    Readers get the last known status instantly instead of waiting on the
+    network. The status is None until the first check completes.
+    """
+
+    def __init__(self, check, interval=HEALTH_CHECK_INTERVAL):
+        self.check = check
+        self.interval = interval
+        self.online = None
+        self.checked_at = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rasa-health-monitor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Run a check now and return the result"""
+        online = self.check()
+        self.online = online
+        self.checked_at = time.time()
+        return online
+
+    def request_refresh(self):
+        """Ask the background thread to check again without waiting for it"""
+        self._wake.set()
+
+    def age(self):
+        """Seconds since the last completed check, or None"""
+        return None if self.checked_at is None else time.time() - self.checked_at
@@ -0,0 +1,160 @@
+"""Local stand-in for a Rasa server, for testing and benchmarking app.py offline.
+
+Implements the endpoints the Streamlit app talks to:
+
+- GET  /                       -> "Hello from Rasa: <version>"
+- GET  /status                 -> JSON status document
+- POST /webhooks/rest/webhook  -> JSON list of bot messages, or, with
+                                  ?stream=true, one JSON message per line
+                                  sent as each one is "produced"
+
+Usage:
+    python stub_rasa_server.py --port 5005 --messages 3 --delay 0.5
+    RASA_SERVER_URL=http://localhost:5005 streamlit run app.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- CONFIGURATION ---
+STUB_RASA_VERSION = "3.6.0"
+DEFAULT_PORT = 5005
+
+
+def make_replies(message, sender, count):
+    """The bot's replies to one message: an echo, then numbered follow-ups"""
+    replies = [{"recipient_id": sender, "text": f"You said: {message}"}]
+    for n in range(2, count + 1):
+        replies.append({"recipient_id": sender, "text": f"Stub reply {n} of {count}"})
+    return replies
+
+
+class StubRasaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # client's delayed ACK adds ~40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+
+    # Set on the server instance (see make_server)
+    @property
+    def options(self):
+        return self.server.stub_options
+
+    def log_message(self, format, *args):
+        if self.options["verbose"]:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/":
+            body = f"Hello from Rasa: {STUB_RASA_VERSION}".encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/status":
+            self.send_json(200, {
+                "model_file": "models/stub.tar.gz",
+                "model_id": "stub",
+                "num_active_training_jobs": 0
+            })
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if url.path != "/webhooks/rest/webhook":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": "invalid JSON"})
+            return
+
+        self.server.record_request()
+        replies = make_replies(
+            str(payload.get("message", "")),
+            str(payload.get("sender", "default")),
+            self.options["messages"]
+        )
+        delay = self.options["delay"]
+        stream = parse_qs(url.query).get("stream", ["false"])[0].lower() in ("true", "1")
+
+        if not stream:
+            time.sleep(delay * len(replies))
+            self.send_json(200, replies)
+            return
+
+        # Stream mode: one JSON line per message, flushed as soon as it is ready
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for reply in replies:
+            time.sleep(delay)
+            chunk = (json.dumps(reply) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubRasaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, messages=2, delay=0.0, verbose=False):
+        super().__init__(address, StubRasaHandler)
+        self.stub_options = {"messages": messages, "delay": delay, "verbose": verbose}
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_in_background(port=0, messages=2, delay=0.0):
+    """Start a stub server on a daemon thread and return it (port 0 picks a free port)"""
+    server = StubRasaServer(("127.0.0.1", port), messages=messages, delay=delay)
+    thread = threading.Thread(target=server.serve_forever, name="stub-rasa-server", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub Rasa server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--messages", type=int, default=2, help="bot messages per reply")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each bot message")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = StubRasaServer((args.host, args.port), args.messages, args.delay, args.verbose)
+    print(f"Stub Rasa server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,47 @@
+import random
+import string
+
+from actions.corpus import DEDUP_BLOCK_SIZE, Deduplicator
+
+QUESTIONS = [
+    "How do I reset my password for the online banking portal?",
+    "What are the opening hours of the branch on Sundays?",
+    "Can I open a savings account without visiting a branch?",
+    "How long does an international transfer usually take?",
+]
+
+
+def test_keeps_distinct_questions():
+    dedup = Deduplicator()
+    assert dedup.filter(QUESTIONS, ["answer"] * len(QUESTIONS)) == [True] * len(QUESTIONS)
+    assert dedup.report().kept_rows == len(QUESTIONS)
+
+
+def test_drops_exact_duplicates_after_normalizing():
+    dedup = Deduplicator()
+    questions = QUESTIONS + ["how do I reset my password for the ONLINE banking portal",
+                             "What are the opening hours of the branch on Sundays?"]
+    flags = dedup.filter(questions, ["answer"] * len(questions))
+    assert flags == [True] * len(QUESTIONS) + [False, False]
+    assert dedup.report().exact_duplicates == 2
+    assert dedup.report().near_duplicates == 0
+
+
+def test_drops_near_duplicates():
+    dedup = Deduplicator()
+    questions = QUESTIONS + ["How do I reset my password for the online banking portal today?"]
+    flags = dedup.filter(questions, ["answer"] * len(questions))
+    assert flags == [True] * len(QUESTIONS) + [False]
+    assert dedup.report().near_duplicates == 1
+
+
+def test_first_occurrence_wins_across_batches_and_blocks():
+    dedup = Deduplicator()
+    rng = random.Random(3)
+    filler = [" ".join("".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(5))
+              for _ in range(DEDUP_BLOCK_SIZE)]
+    first = dedup.filter(filler + QUESTIONS[:2], ["answer"] * (len(filler) + 2))
+    second = dedup.filter(QUESTIONS, ["other answer"] * len(QUESTIONS))
+    assert all(first)
+    assert second == [False, False, True, True]
+    assert dedup.report().kept_rows == len(filler) + len(QUESTIONS)
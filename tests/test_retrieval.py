@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pytest
+
+from actions.knowledge_base import KnowledgeBaseIndex, TermTable
+from actions.retrieval import BruteForceRetriever, InvertedIndexRetriever
+
+WORDS = ["account", "balance", "card", "loan", "rate", "branch", "open", "close", "transfer",
+         "fee", "online", "password", "reset", "limit", "deposit", "interest", "statement", "pin"]
+
+
+def random_corpus(seed, size):
+    rng = random.Random(seed)
+    questions = [" ".join(rng.choices(WORDS, k=rng.randint(2, 8))) for _ in range(size)]
+    # Repeated questions score exactly the same, so every query has ties to break
+    questions += rng.sample(questions, size // 5)
+    rng.shuffle(questions)
+    return questions
+
+
+@pytest.fixture(scope="module")
+def index():
+    questions = random_corpus(seed=7, size=400)
+    return KnowledgeBaseIndex.from_pairs(questions, [f"answer {i}" for i in range(len(questions))])
+
+
+@pytest.mark.parametrize("k", [1, 3, 10, 50])
+def test_inverted_index_matches_brute_force(index, k):
+    brute_force = BruteForceRetriever(index.question_matrix)
+    inverted = InvertedIndexRetriever(index.question_matrix)
+    for query in random_corpus(seed=11, size=100) + ["unknown words only", ""]:
+        vector = index.transform([query])
+        expected = brute_force.search(vector, k)
+        found = inverted.search(vector, k)
+        assert [doc for doc, _ in found] == [doc for doc, _ in expected], query
+        assert [score for _, score in found] == pytest.approx([score for _, score in expected])
+
+
+def test_ties_go_to_the_lower_question(index):
+    inverted = InvertedIndexRetriever(index.question_matrix)
+    question = next(q for q in index.questions if index.questions.count(q) > 1)
+    copies = [i for i, q in enumerate(index.questions) if q == question]
+    found = inverted.search(index.transform([question]), k=len(copies))
+    assert [doc for doc, _ in found] == copies
+
+
+def test_term_table_round_trip(index, tmp_path):
+    path = str(tmp_path / "kb.kbindex")
+    index.save(path, source_sha256="test")
+    loaded = KnowledgeBaseIndex.load(path, source_sha256="test")
+
+    assert isinstance(loaded.vocabulary, TermTable)
+    assert len(loaded.vocabulary) == len(index.vocabulary)
+    for term, col in index.vocabulary.items():
+        assert loaded.vocabulary.get(term) == col
+    for term in ["", "missing", "account balances", "cärd", "zzz zzz"]:
+        assert term not in index.vocabulary
+        assert loaded.vocabulary.get(term) is None
+        assert loaded.vocabulary.get(term, -1) == -1
+
+    query = "reset my card password"
+    assert loaded.search(query, k=5) == index.search(query, k=5)
+    assert np.array_equal(loaded.transform([query]).toarray(), index.transform([query]).toarray())
@@ -1,11 +1,27 @@
 @echo off
-echo Starting Rasa training...
+rem Usage: train.bat [default^|fast]
+rem "fast" trains with config_fast.yml (fewer epochs, smaller featurizers)
+set PROFILE=%1
+if "%PROFILE%"=="" set PROFILE=default
+if "%PROFILE%"=="fast" (
+    set CONFIG=config_fast.yml
+) else if "%PROFILE%"=="default" (
+    set CONFIG=config.yml
+) else (
+    echo Unknown profile '%PROFILE%' ^(expected default or fast^)
+    exit /b 1
+)
+
+echo Starting Rasa training (%PROFILE% profile, %CONFIG%)...
 
 set RASA_TELEMETRY_ENABLED=false
 set TF_CPP_MIN_LOG_LEVEL=2
 
+echo Compiling knowledge base...
+python -m actions.knowledge_base
+
 echo Training model (this may take a few minutes)...
-rasa train --verbose
+rasa train --config %CONFIG% --verbose
 
 echo Training completed!
 echo To test your bot, run: rasa shell
@@ -1,5 +1,17 @@
 #!/bin/bash
-echo "Starting Rasa training..."
+# Usage: ./train.sh [default|fast]
+# "fast" trains with config_fast.yml (fewer epochs, smaller featurizers)
+PROFILE=${1:-default}
+if [ "$PROFILE" = "fast" ]; then
+    CONFIG=config_fast.yml
+elif [ "$PROFILE" = "default" ]; then
+    CONFIG=config.yml
+else
+    echo "Unknown profile '$PROFILE' (expected default or fast)"
+    exit 1
+fi
+
+echo "Starting Rasa training ($PROFILE profile, $CONFIG)..."
 
 # Disable telemetry for faster training
 export RASA_TELEMETRY_ENABLED=false
@@ -7,9 +19,13 @@ export RASA_TELEMETRY_ENABLED=false
 # Suppress TensorFlow warnings
 export TF_CPP_MIN_LOG_LEVEL=2
 
+# Compile the knowledge base used by the fallback action
+echo "Compiling knowledge base..."
+python -m actions.knowledge_base
+
 # Train the model
 echo "Training model (this may take a few minutes)..."
-rasa train --verbose
+rasa train --config "$CONFIG" --verbose
 
 echo "Training completed!"
 echo "To test your bot, run: rasa shell"